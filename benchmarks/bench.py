@@ -0,0 +1,321 @@
+"""
+Benchmarks of the hot paths of straw on synthetic Pile-like documents.
+
+    python benchmarks/bench.py run --output results.json
+    python benchmarks/bench.py compare base.json results.json
+
+Each benchmark runs in a fresh (spawned) process, and reports the throughput of its
+best repeat in docs/s and MB/s (of utf-8 input), and the peak RSS of the process
+(of its largest worker for the end-to-end pipeline).
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing as mp
+
+from synthetic import SUBSETS, synthetic_docs, write_jsonl
+
+
+def preprocessor_benchmark(name, subset):
+    def setup(args):
+        import straw.preprocessing
+
+        process = getattr(straw.preprocessing, name)
+        docs = synthetic_docs(subset, args.docs, args.doc_size, args.seed)
+        return docs, lambda: [process(doc) for doc in docs]
+
+    return setup
+
+
+def normalizer_benchmark(fast):
+    def setup(args):
+        from straw.normalizer import TextNormalizer
+        from straw.preprocessing import process_webcrawls
+
+        normalizer = TextNormalizer(fast=fast)
+        docs = synthetic_docs("Pile-CC", args.docs, args.doc_size, args.seed)
+        paragraphs = [process_webcrawls(doc) for doc in docs]
+        return docs, lambda: [normalizer(doc) for doc in paragraphs]
+
+    return setup
+
+
+def language_filter_benchmark(args):
+    from straw.filtering import LanguageFilter
+
+    language_filter = LanguageFilter()
+    docs = synthetic_docs("Pile-CC", args.docs, args.doc_size, args.seed)
+    return docs, lambda: language_filter.get_unk_ratios(docs)
+
+
+def quality_scorer_benchmark(args):
+    from straw.filtering import QualityScorer
+
+    quality_scorer = QualityScorer()
+    docs = synthetic_docs("Pile-CC", args.docs, args.doc_size, args.seed)
+    return docs, lambda: quality_scorer.score(docs)
+
+
+def redundancy_filter_benchmark(args):
+    from straw.filtering import RedundancyFilter
+
+    redundancy_filter = RedundancyFilter()
+    docs = synthetic_docs("Pile-CC", args.docs, args.doc_size, args.seed)
+    windows = [doc[i : i + 1000] for doc in docs for i in range(0, len(doc), 1000)]
+    return docs, lambda: redundancy_filter.get_token_char_ratio(windows)
+
+
+def sentence_split_benchmark(args):
+    from straw.preprocessing import naive_sentence_split
+
+    docs = synthetic_docs("Wikipedia (en)", args.docs, args.doc_size, args.seed)
+    return docs, lambda: [naive_sentence_split(doc, 1024) for doc in docs]
+
+
+def pipeline_benchmark(args):
+    from straw_cli.main import cli_main
+
+    directory = tempfile.mkdtemp()
+    input_path = os.path.join(directory, "input.jsonl")
+    write_jsonl(input_path, SUBSETS, args.docs, args.doc_size, args.seed)
+    with open(input_path, encoding="utf-8") as f:
+        docs = [json.loads(line)["text"] for line in f]
+
+    def run():
+        sys.argv = [
+            "straw-process-pile",
+            "--input-jsonl",
+            input_path,
+            "--output-jsonl",
+            os.path.join(directory, "output.jsonl"),
+            "--nworkers",
+            str(args.nworkers),
+        ] + args.pipeline_args.split()
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(
+                devnull
+            ):
+                cli_main()
+
+    return docs, run
+
+
+BENCHMARKS = {
+    "preprocess_books3": preprocessor_benchmark("process_books3", "Books3"),
+    "preprocess_gutenberg": preprocessor_benchmark(
+        "process_gutenberg", "Gutenberg (PG-19)"
+    ),
+    "preprocess_webcrawls": preprocessor_benchmark("process_webcrawls", "Pile-CC"),
+    "preprocess_wiki": preprocessor_benchmark("process_wiki", "Wikipedia (en)"),
+    "normalizer": normalizer_benchmark(fast=False),
+    "normalizer_fast": normalizer_benchmark(fast=True),
+    "language_filter": language_filter_benchmark,
+    "quality_scorer": quality_scorer_benchmark,
+    "redundancy_filter": redundancy_filter_benchmark,
+    "sentence_split": sentence_split_benchmark,
+    "pipeline": pipeline_benchmark,
+}
+
+
+def run_benchmark(name, args, connection):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    docs, function = BENCHMARKS[name](args)
+    size = sum(len(doc.encode("utf-8")) for doc in docs)
+
+    seconds = []
+    for _ in range(1 if name == "pipeline" else args.repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak_rss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    connection.send(
+        {
+            "docs": len(docs),
+            "bytes": size,
+            "seconds": min(seconds),
+            "docs_per_s": len(docs) / min(seconds),
+            "mb_per_s": size / 1e6 / min(seconds),
+            "peak_rss_mb": peak_rss * scale / 1e6,
+        }
+    )
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.decode().strip()
+
+
+def run(args):
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    context = mp.get_context("spawn")
+    results, failed = {}, []
+    for name in names:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_benchmark, args=(name, args, sender))
+        process.start()
+        # Only the child holds the sending end, so recv() raises EOFError if it dies
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            result = None
+        process.join()
+        if result is None or process.exitcode != 0:
+            print("{:<22}failed with exit code {}".format(name, process.exitcode))
+            failed.append(name)
+            continue
+        results[name] = result
+        print(
+            "{:<22}{:>10.1f} docs/s{:>10.2f} MB/s{:>10.1f} MB peak RSS".format(
+                name, result["docs_per_s"], result["mb_per_s"], result["peak_rss_mb"]
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "params": {
+                        "docs": args.docs,
+                        "doc_size": args.doc_size,
+                        "seed": args.seed,
+                        "repeat": args.repeat,
+                        "nworkers": args.nworkers,
+                        "pipeline_args": args.pipeline_args,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if failed:
+        print("{} failed".format(", ".join(failed)))
+        sys.exit(1)
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base["params"] != new["params"]:
+        print("Warning: the benchmarks were run with different parameters")
+
+    regressions = []
+    print(
+        "{:<22}{:>14}{:>14}{:>9}{:>12}{:>12}".format(
+            "benchmark", "base MB/s", "new MB/s", "change", "base RSS", "new RSS"
+        )
+    )
+    for name, result in new["results"].items():
+        if name not in base["results"]:
+            continue
+        before = base["results"][name]
+        change = result["mb_per_s"] / before["mb_per_s"] - 1
+        if change < -args.threshold:
+            regressions.append(name)
+        print(
+            "{:<22}{:>14.2f}{:>14.2f}{:>+8.1f}%{:>12.1f}{:>12.1f}{}".format(
+                name,
+                before["mb_per_s"],
+                result["mb_per_s"],
+                100 * change,
+                before["peak_rss_mb"],
+                result["peak_rss_mb"],
+                "  <- regression" if name in regressions else "",
+            )
+        )
+
+    if regressions:
+        print(
+            "{} regressed by more than {:.0%}".format(
+                ", ".join(regressions), args.threshold
+            )
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Benchmark the hot paths of straw.")
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument(
+        "--output", type=str, default=None, help="Path to save the results as json"
+    )
+    run_parser.add_argument(
+        "--only",
+        type=str,
+        default=None,
+        help="Comma separated benchmarks to run, out of: " + ", ".join(BENCHMARKS),
+    )
+    run_parser.add_argument(
+        "--docs", type=int, default=20, help="Number of docs (per subset)"
+    )
+    run_parser.add_argument(
+        "--doc-size", type=int, default=50_000, help="Size of the docs in characters"
+    )
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of runs, the best one is kept"
+    )
+    run_parser.add_argument(
+        "--nworkers", type=int, default=2, help="Number of workers of the pipeline"
+    )
+    run_parser.add_argument(
+        "--pipeline-args",
+        type=str,
+        default="",
+        help="Extra arguments of straw-process-pile, e.g. '--fast-normalize'",
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare the results of two runs"
+    )
+    compare_parser.add_argument("base", type=str)
+    compare_parser.add_argument("new", type=str)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Throughput drop reported as a regression (exits with status 1)",
+    )
+
+    args = argparser.parse_args()
+    if args.command == "run":
+        if args.only:
+            unknown = [name for name in args.only.split(",") if name not in BENCHMARKS]
+            if unknown:
+                run_parser.error(
+                    "Unknown benchmarks {}, should be out of: {}".format(
+                        ", ".join(unknown), ", ".join(BENCHMARKS)
+                    )
+                )
+        run(args)
+    else:
+        compare(args)
@@ -0,0 +1,123 @@
+"""
+Startup time of the command line entry points of straw.
+
+    python benchmarks/startup.py --nworkers 16 --output startup.json
+
+For each entry point, reports the best time of --repeat runs of `--help` (imports and
+argument parsing), and for the entry points that start workers, of a run on a tiny
+input with --nworkers workers (dominated by the startup and the shutdown of the pool).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from synthetic import SUBSETS, synthetic_docs, write_jsonl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "straw-process-pile": "straw_cli.main",
+    "straw-normalize": "straw_cli.normalize",
+    "straw-filter-lang": "straw_cli.filter_lang",
+    "straw-pipeline": "straw_cli.pipeline",
+    "straw-merge-hashes": "straw_cli.merge_hashes",
+    "straw-merge-shards": "straw_cli.merge_shards",
+}
+
+
+def run_arguments(name, directory, nworkers):
+    """
+    Returns the arguments of a run of the entry point on a tiny input, or None.
+    """
+    if name == "straw-process-pile":
+        input_path = os.path.join(directory, "pile.jsonl")
+        if not os.path.exists(input_path):
+            write_jsonl(input_path, SUBSETS, 2, 2000)
+    elif name in ("straw-normalize", "straw-filter-lang", "straw-pipeline"):
+        input_path = os.path.join(directory, "docs.jsonl")
+        if not os.path.exists(input_path):
+            with open(input_path, "w", encoding="utf-8") as f:
+                for text in synthetic_docs("Pile-CC", 10, 2000):
+                    f.write(json.dumps(text) + "\n")
+    else:
+        return None
+
+    if name == "straw-pipeline":
+        extra = ["--stages", "normalize,filter_lang"]
+    else:
+        extra = []
+    output_path = os.path.join(directory, "output.jsonl")
+    return [
+        "--input-jsonl",
+        input_path,
+        "--output-jsonl",
+        output_path,
+        "--nworkers",
+        str(nworkers),
+    ] + extra
+
+
+def time_command(name, arguments, repeat):
+    code = "import sys; from {} import cli_main; sys.argv = {!r}; cli_main()".format(
+        ENTRY_POINTS[name], [name] + arguments
+    )
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=ROOT,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmark the startup time of the straw entry points."
+    )
+    argparser.add_argument(
+        "--output", type=str, default=None, help="Path to save the results as json"
+    )
+    argparser.add_argument(
+        "--nworkers", type=int, default=8, help="Number of workers of the runs"
+    )
+    argparser.add_argument(
+        "--repeat", type=int, default=3, help="Number of runs, the best one is kept"
+    )
+    args = argparser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    results = {}
+    print("{:<22}{:>10}{:>10}".format("entry point", "help (s)", "run (s)"))
+    for name in ENTRY_POINTS:
+        results[name] = {"help_s": time_command(name, ["--help"], args.repeat)}
+        arguments = run_arguments(name, directory, args.nworkers)
+        if arguments is not None:
+            results[name]["run_s"] = time_command(name, arguments, args.repeat)
+        print(
+            "{:<22}{:>10.2f}{:>10}".format(
+                name,
+                results[name]["help_s"],
+                "{:.2f}".format(results[name]["run_s"]) if arguments else "-",
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "nworkers": args.nworkers,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
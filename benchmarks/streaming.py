@@ -0,0 +1,153 @@
+"""
+Throughput of the asyncio streaming API (straw/streaming.py) fed by an in-process
+producer of synthetic Pile records.
+
+    python benchmarks/streaming.py --nworkers 16 --docs 200 --output streaming.json
+
+Reports the docs/s and MB/s of the stream, and the utilization of the workers: their
+CPU time over the wall time of the run times the number of workers (close to 100%
+when the producer and the event loop keep all the workers busy).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+
+from synthetic import SUBSETS, synthetic_docs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def produce(records, rate):
+    """
+    Yields the records, at about rate records per second if rate > 0.
+    """
+    start = time.perf_counter()
+    for i, record in enumerate(records):
+        if rate > 0:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield record
+
+
+async def run(args, records):
+    from straw.streaming import StreamProcessor
+    from straw_cli.main import StrawProcessor
+
+    async with StreamProcessor(
+        StrawProcessor.from_options(**json.loads(args.straw_options)),
+        nworkers=args.nworkers,
+        batch_size=args.batch_size,
+        max_inflight=args.max_inflight,
+    ) as stream_processor:
+        # Start the workers (and load their models) before the timed run
+        async for _ in stream_processor.process(produce(records[:1], 0)):
+            pass
+
+        workers_cpu = cpu_seconds(resource.RUSAGE_CHILDREN)
+        main_cpu = cpu_seconds(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        cleaned = 0
+        async for _ in stream_processor.process(produce(records, args.rate)):
+            cleaned += 1
+        seconds = time.perf_counter() - start
+        main_cpu = cpu_seconds(resource.RUSAGE_SELF) - main_cpu
+
+    # The CPU time of the workers is accounted once they exit
+    workers_cpu = cpu_seconds(resource.RUSAGE_CHILDREN) - workers_cpu
+    return cleaned, seconds, workers_cpu, main_cpu
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Benchmark the asyncio streaming API of straw."
+    )
+    argparser.add_argument(
+        "--output", type=str, default=None, help="Path to save the results as json"
+    )
+    argparser.add_argument(
+        "--docs", type=int, default=40, help="Number of docs (per subset)"
+    )
+    argparser.add_argument(
+        "--doc-size", type=int, default=20_000, help="Size of the docs in characters"
+    )
+    argparser.add_argument("--seed", type=int, default=0)
+    argparser.add_argument(
+        "--nworkers", type=int, default=os.cpu_count(), help="Number of workers"
+    )
+    argparser.add_argument(
+        "--batch-size", type=int, default=16, help="Number of records per batch"
+    )
+    argparser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=None,
+        help="Number of batches in flight (2 per worker by default)",
+    )
+    argparser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Records per second of the producer, 0 for as fast as possible",
+    )
+    argparser.add_argument(
+        "--straw-options",
+        type=str,
+        default='{"min_text_length": 1000, "max_text_length": 5000}',
+        help="""Options of straw-process-pile as a json object, e.g.
+        '{"fast_normalize": true}'""",
+    )
+    args = argparser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    records = [
+        {"text": text, "meta": {"pile_set_name": subset}}
+        for subset in SUBSETS
+        for text in synthetic_docs(subset, args.docs, args.doc_size, args.seed)
+    ]
+    random.Random(args.seed).shuffle(records)
+    size = sum(len(record["text"].encode("utf-8")) for record in records)
+
+    cleaned, seconds, workers_cpu, main_cpu = asyncio.run(run(args, records))
+    results = {
+        "docs": len(records),
+        "cleaned_records": cleaned,
+        "bytes": size,
+        "seconds": seconds,
+        "docs_per_s": len(records) / seconds,
+        "mb_per_s": size / 1e6 / seconds,
+        "worker_utilization": workers_cpu / (seconds * args.nworkers),
+        "main_cpu_s": main_cpu,
+    }
+    print(
+        "{:.1f} docs/s, {:.2f} MB/s, {} records, workers {:.0%} busy, "
+        "main process {:.2f} CPU s".format(
+            results["docs_per_s"],
+            results["mb_per_s"],
+            cleaned,
+            results["worker_utilization"],
+            main_cpu,
+        )
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "params": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
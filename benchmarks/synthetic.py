@@ -0,0 +1,174 @@
+"""
+Generates synthetic Pile-like jsonl documents for the benchmarks, with the layout
+of each subset (Books3 markdown, Gutenberg headers and hard wrapped lines, web page
+boilerplate, Wikipedia sections) around sentences of wiki-processed-sample.txt.
+"""
+import os
+import re
+import json
+import random
+import argparse
+import textwrap
+
+from typing import List
+
+SEED_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "wiki-processed-sample.txt",
+)
+SUBSETS = [
+    "Books3",
+    "Gutenberg (PG-19)",
+    "OpenWebText2",
+    "Pile-CC",
+    "Wikipedia (en)",
+]
+
+
+def load_sentences(path: str = SEED_PATH) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return [s for s in re.split(r"(?<=[.?!])\s+", text) if len(s) > 20]
+
+
+def paragraph(rng: random.Random, sentences: List[str]) -> str:
+    return " ".join(rng.choice(sentences) for _ in range(rng.randint(2, 8)))
+
+
+def books3_part(rng, sentences, chapter):
+    lines = ["# Chapter {}".format(chapter), ""]
+    if rng.random() < 0.3:
+        lines += ["**{}**".format(rng.choice(sentences)[:60]), ""]
+    for _ in range(rng.randint(3, 12)):
+        text = paragraph(rng, sentences)
+        if rng.random() < 0.2:
+            words = text.split(" ")
+            i = rng.randrange(len(words))
+            words[i] = "_{}_".format(words[i])
+            text = " ".join(words)
+        lines += [text, ""]
+    return "\n".join(lines) + "\n\n"
+
+
+def gutenberg_part(rng, sentences, chapter):
+    lines = ["CHAPTER {}".format(chapter), ""]
+    for _ in range(rng.randint(3, 12)):
+        if rng.random() < 0.1:
+            lines += ["[Illustration: {}]".format(rng.choice(sentences)[:40]), ""]
+        lines += textwrap.wrap(paragraph(rng, sentences), 70) + [""]
+    return "\n".join(lines) + "\n\n\n"
+
+
+def webcrawl_part(rng, sentences, chapter):
+    lines = []
+    if rng.random() < 0.3:
+        lines.append("Home | About | Contact | Privacy Policy")
+    for _ in range(rng.randint(1, 6)):
+        lines.append("  " * rng.randint(0, 1) + paragraph(rng, sentences))
+    if rng.random() < 0.2:
+        lines.append("Share this: Twitter Facebook")
+    return "\n".join(lines) + "\n"
+
+
+def wiki_part(rng, sentences, chapter):
+    lines = []
+    if chapter > 1:
+        lines += ["Section {}".format(chapter), ""]
+    for _ in range(rng.randint(2, 6)):
+        lines += [paragraph(rng, sentences), ""]
+    return "\n".join(lines) + "\n"
+
+
+PARTS = {
+    "Books3": books3_part,
+    "Gutenberg (PG-19)": gutenberg_part,
+    "OpenWebText2": webcrawl_part,
+    "Pile-CC": webcrawl_part,
+    "Wikipedia (en)": wiki_part,
+}
+
+
+def synthetic_text(
+    subset: str, size: int, rng: random.Random, sentences: List[str]
+) -> str:
+    """
+    Returns a text of about size characters laid out like the docs of subset.
+    """
+    parts = []
+    if subset == "Gutenberg (PG-19)":
+        parts.append(
+            "The Project Gutenberg EBook of A Synthetic Book\n\n"
+            "Produced by the straw benchmarks\n\n\n\n"
+        )
+
+    length, chapter = sum(len(part) for part in parts), 1
+    while length < size:
+        parts.append(PARTS[subset](rng, sentences, chapter))
+        length += len(parts[-1])
+        chapter += 1
+
+    if subset == "Gutenberg (PG-19)":
+        parts.append(
+            "\n\n*** END OF THIS PROJECT GUTENBERG EBOOK A SYNTHETIC BOOK ***\n\n"
+            + paragraph(rng, sentences)
+        )
+    elif subset == "Wikipedia (en)":
+        parts.append("See also\n\nReferences\n\nExternal links\n")
+    return "".join(parts)
+
+
+def synthetic_docs(subset: str, num_docs: int, size: int, seed=0) -> List[str]:
+    """
+    Returns num_docs synthetic texts of subset, of about size characters each.
+    """
+    rng = random.Random("{}-{}".format(subset, seed))
+    sentences = load_sentences()
+    return [synthetic_text(subset, size, rng, sentences) for _ in range(num_docs)]
+
+
+def write_jsonl(path: str, subsets: List[str], num_docs: int, size: int, seed=0) -> int:
+    """
+    Writes num_docs docs of each subset to a Pile jsonl file (interleaving the
+    subsets), and returns the size of the file in bytes.
+    """
+    docs = [
+        (subset, text)
+        for subset in subsets
+        for text in synthetic_docs(subset, num_docs, size, seed)
+    ]
+    random.Random(seed).shuffle(docs)
+    with open(path, "w", encoding="utf-8") as f:
+        for subset, text in docs:
+            f.write(json.dumps({"text": text, "meta": {"pile_set_name": subset}}))
+            f.write("\n")
+    return os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description="Generate a synthetic Pile-like jsonl file."
+    )
+    argparser.add_argument("--output-jsonl", type=str, required=True)
+    argparser.add_argument(
+        "--subsets",
+        type=str,
+        default=",".join(SUBSETS),
+        help="Comma separated subsets to generate",
+    )
+    argparser.add_argument(
+        "--docs-per-subset", type=int, default=20, help="Number of docs per subset"
+    )
+    argparser.add_argument(
+        "--doc-size", type=int, default=50_000, help="Size of the docs in characters"
+    )
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    size = write_jsonl(
+        args.output_jsonl,
+        args.subsets.split(","),
+        args.docs_per_subset,
+        args.doc_size,
+        args.seed,
+    )
+    print("Wrote {} bytes to {}".format(size, args.output_jsonl))
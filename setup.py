@@ -12,6 +12,7 @@ setup(
     ],
     setup_requires=["setuptools>=18.0"],
     install_requires=["numpy", "tokenizers", "tqdm"],
+    extras_require={"zstd": ["zstandard"], "json": ["orjson"], "arrow": ["pyarrow"]},
     packages=find_packages(exclude=["fiction", "fiction.*",]),
     package_data={"straw": ["*.json", "*.pkl"]},
     entry_points={
@@ -19,6 +20,9 @@ setup(
             "straw-normalize = straw_cli.normalize:cli_main",
             "straw-filter-lang = straw_cli.filter_lang:cli_main",
             "straw-process-pile = straw_cli.main:cli_main",
+            "straw-merge-hashes = straw_cli.merge_hashes:cli_main",
+            "straw-merge-shards = straw_cli.merge_shards:cli_main",
+            "straw-pipeline = straw_cli.pipeline:cli_main",
         ],
     },
     include_package_data=True,
@@ -21,4 +21,6 @@ straw-process-pile \
     --min-text-length 15000 \
     --chunk-text True \
     --text-chunk-size 1024 \
+    --checkpoint-interval 600 \
+    --resume \
     --pile-subsets "Books3,Gutenberg (PG-19),OpenWebText2,Pile-CC,Wikipedia (en)"
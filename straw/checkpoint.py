@@ -0,0 +1,96 @@
+import os
+import json
+import bisect
+
+from typing import List, Tuple
+
+
+class Checkpoint(object):
+    """
+    Keeps track of the completed byte ranges of an input file, together with
+    the committed offset of the output file and any extra state of the run.
+    Ranges may complete in any order (e.g. with imap_unordered), they are kept
+    as a sorted list of disjoint [start, end) intervals.
+    """
+
+    def __init__(self, path: str, input_path: str = None):
+        self.path = path
+        self.input_path = input_path
+        self.starts, self.ends = [], []
+        self.output_offset = 0
+        self.state = {}
+
+    def add(self, start: int, end: int):
+        """
+        Marks the byte range [start, end) as completed.
+        """
+        if start >= end:
+            return
+
+        # Merge with all the intervals that overlap or touch [start, end)
+        lo = bisect.bisect_left(self.ends, start)
+        hi = bisect.bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def covers(self, start: int, end: int) -> bool:
+        """
+        Returns True if the byte range [start, end) is already completed.
+        """
+        idx = bisect.bisect_right(self.starts, start) - 1
+        return idx >= 0 and self.ends[idx] >= end
+
+    def missing(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Returns the parts of the byte range [start, end) that are not completed yet.
+        """
+        gaps = []
+        idx = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        while start < end and idx < len(self.starts):
+            if self.starts[idx] >= end:
+                break
+            if self.starts[idx] > start:
+                gaps.append((start, self.starts[idx]))
+            start = max(start, self.ends[idx])
+            idx += 1
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+    @property
+    def completed(self) -> List[Tuple[int, int]]:
+        return list(zip(self.starts, self.ends))
+
+    def save(self):
+        """
+        Atomically writes the checkpoint to disk.
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "input": self.input_path,
+                    "completed": self.completed,
+                    "output_offset": self.output_offset,
+                    "state": self.state,
+                },
+                f,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        with open(path) as f:
+            data = json.load(f)
+
+        checkpoint = cls(path, data["input"])
+        for start, end in data["completed"]:
+            checkpoint.add(start, end)
+        checkpoint.output_offset = data["output_offset"]
+        checkpoint.state = data["state"]
+        return checkpoint
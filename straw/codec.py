@@ -0,0 +1,76 @@
+import re
+import json
+
+from json.encoder import encode_basestring, encode_basestring_ascii
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STRING_VALUE = re.compile(rb'\s*:\s*"([^"\\]*)"')
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes a json document, with orjson if it is installed.
+    Raises json.JSONDecodeError for invalid documents.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. lone surrogates, that json accepts
+    return json.loads(data)
+
+
+def _encode_str(text: str, ensure_ascii: bool) -> str:
+    if ensure_ascii:
+        return encode_basestring_ascii(text)
+    if orjson is not None:
+        try:
+            return orjson.dumps(text).decode("utf-8")
+        except TypeError:
+            pass  # Lone surrogates
+    return encode_basestring(text)
+
+
+def json_dumps(obj: Any, ensure_ascii=True) -> str:
+    """
+    Encodes obj exactly like json.dumps(obj, ensure_ascii=ensure_ascii).
+    Strings and flat dicts of strings (the records written by straw) are encoded
+    directly, with orjson if it is installed, other objects with json.dumps.
+    """
+    if isinstance(obj, str):
+        return _encode_str(obj, ensure_ascii)
+    if isinstance(obj, dict) and all(
+        isinstance(key, str) and isinstance(value, str) for key, value in obj.items()
+    ):
+        return (
+            "{"
+            + ", ".join(
+                _encode_str(key, ensure_ascii) + ": " + _encode_str(value, ensure_ascii)
+                for key, value in obj.items()
+            )
+            + "}"
+        )
+    return json.dumps(obj, ensure_ascii=ensure_ascii)
+
+
+def peek_string(line: bytes, key: bytes) -> Optional[str]:
+    """
+    Returns the value of the last "key": "value" string field of a json line
+    without decoding the line, None if it is not found or the value has escapes.
+    Quotes inside json strings are escaped, so the key cannot match inside a value.
+    """
+    position = line.rfind(b'"' + key + b'"')
+    if position < 0 or line[position - 1 : position] == b"\\":
+        return None
+    match = STRING_VALUE.match(line, position + len(key) + 2)
+    if match is None:
+        return None
+    try:
+        return match.group(1).decode("utf-8")
+    except UnicodeDecodeError:
+        return None
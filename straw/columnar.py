@@ -0,0 +1,122 @@
+from typing import List, Sequence, Tuple
+
+FORMATS = ["parquet", "arrow"]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Writing parquet or arrow files requires pyarrow, "
+            "install it with `pip install pyarrow`."
+        ) from e
+    return pyarrow
+
+
+class ColumnarWriter(object):
+    """
+    Writes the output records of straw as columns: subset (dictionary encoded with
+    the given subsets), text, and hash (the 16 bytes of the md5 digest).
+
+    The records are buffered and written as a row group (a record batch of the arrow
+    IPC file format, which can be memory-mapped) every row_group_size bytes of text,
+    so that the file is written incrementally. Parquet row groups have min/max
+    statistics, so readers can skip the row groups of other subsets.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        output_format: str,
+        subsets: Sequence[str],
+        row_group_size=64 * 1024 * 1024,
+    ):
+        if output_format not in FORMATS:
+            raise ValueError(
+                "Unknown output format {}, should be one of {}".format(
+                    output_format, ", ".join(FORMATS)
+                )
+            )
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.subset_ids = {subset: i for i, subset in enumerate(subsets)}
+
+        # The same dictionary for all row groups, the arrow file format can not
+        # replace it between record batches
+        self.dictionary = self.pa.array(list(subsets), self.pa.string())
+        self.schema = self.pa.schema(
+            [
+                ("subset", self.pa.dictionary(self.pa.int32(), self.pa.string())),
+                ("text", self.pa.string()),
+                ("hash", self.pa.binary(16)),
+            ]
+        )
+        if output_format == "parquet":
+            self.writer = self.pa.parquet.ParquetWriter(
+                path, self.schema, write_statistics=True
+            )
+        else:
+            self.writer = self.pa.ipc.new_file(path, self.schema)
+
+        self.subsets, self.texts, self.hashes = [], [], []
+        self.pending_size = 0
+        self.num_rows = 0
+
+    def write(
+        self, records: List[Tuple[str, str]], hashes: List[str], keep: Sequence[bool]
+    ):
+        """
+        Buffers the (subset, text) records whose keep flag is set, with their hex
+        md5 hashes.
+        """
+        for (subset, text), chunk_hash, kept in zip(records, hashes, keep):
+            if kept:
+                self.subsets.append(self.subset_ids[subset])
+                self.texts.append(text)
+                self.hashes.append(bytes.fromhex(chunk_hash))
+                self.pending_size += len(text)
+        if self.pending_size >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records as a row group.
+        """
+        if not self.texts:
+            return
+        pa = self.pa
+        batch = pa.record_batch(
+            [
+                pa.DictionaryArray.from_arrays(
+                    pa.array(self.subsets, pa.int32()), self.dictionary
+                ),
+                pa.array(self.texts, pa.string()),
+                pa.array(self.hashes, pa.binary(16)),
+            ],
+            schema=self.schema,
+        )
+        if self.output_format == "parquet":
+            self.writer.write_batch(batch, row_group_size=len(self.texts))
+        else:
+            self.writer.write_batch(batch)
+        self.num_rows += len(self.texts)
+        self.subsets, self.texts, self.hashes = [], [], []
+        self.pending_size = 0
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.writer.close()
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
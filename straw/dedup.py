@@ -0,0 +1,303 @@
+import os
+import pickle
+import struct
+
+import numpy as np
+
+from typing import Iterable, List, Union
+
+MAGIC = b"STRAWHS1"
+HEADER = struct.Struct("<8sI")
+RUN_HEADER = struct.Struct("<Q")
+
+
+def _digest_dtype(digest_size: int) -> np.dtype:
+    # Big endian integers and raw bytes both sort in the byte order of the digests
+    if digest_size == 8:
+        return np.dtype(">u8")
+    elif digest_size == 16:
+        return np.dtype("V16")
+    raise ValueError("digest_size should be 8 or 16, got {}".format(digest_size))
+
+
+class BloomFilter(object):
+    """
+    A Bloom filter over uniformly distributed digests, with k probes
+    taken from the first 8 bytes of each digest (double hashing).
+    """
+
+    def __init__(self, nbits: int, k=4):
+        self.nbits = nbits
+        self.k = k
+        self.bits = np.zeros((nbits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, digests: np.ndarray) -> np.ndarray:
+        keys = digests.view(">u8")[:: digests.dtype.itemsize // 8].astype(np.uint64)
+        h1, h2 = keys & np.uint64(0xFFFFFFFF), (keys >> np.uint64(32)) | np.uint64(1)
+        probes = np.arange(self.k, dtype=np.uint64)[:, None]
+        return (h1[None, :] + probes * h2[None, :]) % np.uint64(self.nbits)
+
+    def add(self, digests: np.ndarray, block_size=1 << 20):
+        for i in range(0, len(digests), block_size):
+            positions = self._positions(digests[i : i + block_size]).ravel()
+            np.bitwise_or.at(
+                self.bits,
+                positions >> np.uint64(3),
+                (1 << (positions & np.uint64(7))).astype(np.uint8),
+            )
+
+    def contains(self, digests: np.ndarray) -> np.ndarray:
+        """
+        Returns False for digests that are certainly not in the filter.
+        """
+        positions = self._positions(digests)
+        bits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7))) & 1
+        return bits.all(axis=0)
+
+
+class HashStore(object):
+    """
+    A compact set of document digests, replacing a Python set of md5 hex strings.
+
+    Digests are kept as the first `digest_size` (8 or 16) bytes of the md5 hash,
+    in sorted numpy arrays ("runs"). The on-disk format is a header followed by
+    sorted runs, new digests are appended as a new run on every commit(), and the
+    runs of an existing store are memory-mapped instead of being loaded. compact()
+    and merge_stores() rewrite a store as a single run. An optional Bloom filter
+    of `bloom_bits` bits avoids the lookups in the runs for most new digests.
+
+    committed_size restricts loading to the runs committed up to that file size,
+    the runs after it are overwritten by the next commit (used to resume a checkpoint).
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        digest_size=8,
+        bloom_bits=0,
+        flush_size=1 << 20,
+        committed_size=None,
+    ):
+        self.path = path
+        self.digest_size = digest_size
+        self.dtype = _digest_dtype(digest_size)
+        self.flush_size = flush_size
+        self.runs = []  # sorted arrays, memory-mapped ones first
+        self.journal = []  # runs added since the last commit
+        self.pending = set()
+        self.legacy = False
+        self.valid_size = None
+
+        if path is not None and os.path.exists(path):
+            self._load(committed_size)
+
+        self.bloom = None
+        if bloom_bits > 0:
+            self.bloom = BloomFilter(bloom_bits)
+            for run in self.runs:
+                self.bloom.add(run)
+
+    def _load(self, committed_size=None):
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+
+        if not header.startswith(MAGIC):
+            # A pickled set of md5 hex strings, from older versions of straw.
+            with open(self.path, "rb") as f:
+                hashes = pickle.load(f)
+            self.runs.append(np.unique(self.to_array(list(hashes))))
+            self.journal.append(self.runs[-1])
+            self.legacy = True
+            return
+
+        _, self.digest_size = HEADER.unpack(header)
+        self.dtype = dtype = _digest_dtype(self.digest_size)
+        file_size = os.path.getsize(self.path)
+        if committed_size is not None:
+            file_size = min(file_size, committed_size)
+        offset = HEADER.size
+        with open(self.path, "rb") as f:
+            while offset + RUN_HEADER.size <= file_size:
+                f.seek(offset)
+                (count,) = RUN_HEADER.unpack(f.read(RUN_HEADER.size))
+                if offset + RUN_HEADER.size + count * self.digest_size > file_size:
+                    break  # Incomplete run, e.g. killed while committing
+                offset += RUN_HEADER.size
+                if count > 0:
+                    self.runs.append(
+                        np.memmap(
+                            self.path,
+                            dtype=dtype,
+                            mode="r",
+                            offset=offset,
+                            shape=(count,),
+                        )
+                    )
+                offset += count * self.digest_size
+        self.valid_size = offset
+
+    def to_array(self, digests: Iterable[Union[str, bytes]]) -> np.ndarray:
+        """
+        Converts md5 hex strings or raw digests into an array of digests.
+        """
+        raw = b"".join(
+            bytes.fromhex(d[: 2 * self.digest_size])
+            if isinstance(d, str)
+            else d[: self.digest_size]
+            for d in digests
+        )
+        return np.frombuffer(raw, dtype=self.dtype)
+
+    def _as_array(self, digests) -> np.ndarray:
+        if isinstance(digests, np.ndarray):
+            return digests.astype(self.dtype, copy=False)
+        return self.to_array(digests)
+
+    def _in_runs(self, digests: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(digests), dtype=bool)
+        if self.bloom is not None:
+            candidates = np.flatnonzero(self.bloom.contains(digests))
+        else:
+            candidates = np.arange(len(digests))
+
+        for run in self.runs:
+            if len(candidates) == 0:
+                break
+            idx = np.searchsorted(run, digests[candidates])
+            hit = idx < len(run)
+            hit[hit] = run[idx[hit]] == digests[candidates[hit]]
+            found[candidates[hit]] = True
+            candidates = candidates[~hit]
+        return found
+
+    def add_many(self, digests: List[Union[str, bytes]]) -> np.ndarray:
+        """
+        Adds the digests (md5 hex strings, raw digests or an array of digests)
+        to the store, returns a boolean array
+        that is True for the digests that were not in the store before.
+        """
+        if len(digests) == 0:
+            return np.zeros(0, dtype=bool)
+
+        array = self._as_array(digests)
+        new = ~self._in_runs(array)
+        for i in np.flatnonzero(new):
+            key = array[i : i + 1].tobytes()
+            if key in self.pending:
+                new[i] = False
+            else:
+                self.pending.add(key)
+
+        if self.bloom is not None:
+            self.bloom.add(array[new])
+        if len(self.pending) >= self.flush_size:
+            self._flush_pending()
+        return new
+
+    def contains_many(self, digests: List[Union[str, bytes]]) -> np.ndarray:
+        """
+        Returns a boolean array that is True for the digests in the store.
+        """
+        array = self._as_array(digests)
+        found = self._in_runs(array)
+        if self.pending:
+            for i in np.flatnonzero(~found):
+                found[i] = array[i : i + 1].tobytes() in self.pending
+        return found
+
+    def add(self, digest: Union[str, bytes]) -> bool:
+        """
+        Adds a digest to the store, returns True if it was not in the store before.
+        """
+        return bool(self.add_many([digest])[0])
+
+    def __contains__(self, digest: Union[str, bytes]) -> bool:
+        return bool(self.contains_many([digest])[0])
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs) + len(self.pending)
+
+    def _flush_pending(self):
+        if not self.pending:
+            return
+        run = np.sort(np.frombuffer(b"".join(self.pending), dtype=self.dtype))
+        self.pending = set()
+        self.journal.append(run)
+
+        # Merge the in-memory runs like a binary counter, to keep O(log n) runs
+        self.runs.append(run)
+        while (
+            len(self.runs) >= 2
+            and not isinstance(self.runs[-2], np.memmap)
+            and len(self.runs[-2]) <= 2 * len(self.runs[-1])
+        ):
+            merged = np.sort(np.concatenate(self.runs[-2:]))
+            self.runs[-2:] = [merged]
+
+    def commit(self) -> int:
+        """
+        Appends the digests added since the last commit to the store file
+        as a new run, and returns the committed size of the file.
+        """
+        self._flush_pending()
+        if self.legacy or not os.path.exists(self.path):
+            # Start a new file, converting a legacy pickle if needed
+            with open(self.path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, self.digest_size))
+            self.legacy = False
+        elif self.valid_size is not None:
+            # Drop the runs after the committed size, or an interrupted commit
+            os.truncate(self.path, self.valid_size)
+
+        run = np.sort(np.concatenate(self.journal)) if self.journal else None
+        with open(self.path, "ab") as f:
+            if run is not None:
+                f.write(RUN_HEADER.pack(len(run)))
+                f.write(run.astype(self.dtype, copy=False).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            self.valid_size = f.tell()
+        self.journal = []
+        return self.valid_size
+
+    def compact(self, path: str = None) -> int:
+        """
+        Writes all digests of the store as a single run to path (by default,
+        atomically replacing the store file), and returns the number of digests.
+        """
+        self._flush_pending()
+        path = path or self.path
+        merged = np.unique(np.concatenate(self.runs)) if self.runs else []
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.digest_size))
+            f.write(RUN_HEADER.pack(len(merged)))
+            f.write(np.asarray(merged, dtype=self.dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return len(merged)
+
+
+def merge_stores(output_path: str, input_paths: List[str], digest_size=None) -> int:
+    """
+    Merges hash stores (or legacy pickled hash sets) into a single compact store,
+    and returns the number of unique digests. By default, the digest size of
+    the first store is used.
+    """
+    stores = []
+    for path in input_paths:
+        store = HashStore(path, digest_size=digest_size or 8)
+        digest_size = digest_size or store.digest_size
+        if store.digest_size != digest_size:
+            raise ValueError(
+                "{} has {} byte digests, expected {}".format(
+                    path, store.digest_size, digest_size
+                )
+            )
+        stores.append(store)
+
+    merged = HashStore(digest_size=digest_size or 8)
+    for store in stores:
+        merged.runs.extend(store.runs)
+    return merged.compact(output_path)
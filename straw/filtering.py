@@ -1,8 +1,9 @@
 import os
+import re
 import numpy as np
 
-from tokenizers import Tokenizer
-from typing import List, Union
+from tokenizers import Encoding, Tokenizer
+from typing import Dict, List, Tuple, Union
 
 import sentencepiece
 
@@ -10,22 +11,132 @@ tokenizer_path = os.path.join(os.path.dirname(__file__), "word_tokenizer.json")
 spm_path = os.path.join(os.path.dirname(__file__), "sp.model")
 
 
+def encode_prefixes(
+    tokenizer: Tokenizer, lines: List[str], prefix_size=1 << 19
+) -> List[Encoding]:
+    """
+    Encodes the first max_length tokens of each line (the truncation of the tokenizer).
+
+    Only a prefix of each line is encoded, doubling it until the encoding overflows
+    (the cut token is then past max_length) or the prefix covers the whole line.
+    """
+    encodings = [None] * len(lines)
+    todo = list(range(len(lines)))
+    while todo:
+        remaining = []
+        for i, encoding in zip(
+            todo, tokenizer.encode_batch([lines[i][:prefix_size] for i in todo])
+        ):
+            if len(lines[i]) > prefix_size and not encoding.overflowing:
+                remaining.append(i)
+            else:
+                encodings[i] = encoding
+        todo = remaining
+        prefix_size *= 2
+    return encodings
+
+
 class LanguageFilter:
-    def __init__(self, unk_threshold=0.05):
+    """
+    Filters out non-english documents by their ratio of unknown words.
+
+    With sample_windows > 0, documents longer than 2 * sample_windows * window_size
+    characters are first scored on sample_windows evenly spaced windows. When the
+    unk ratio of the windows is below (or above) the threshold by more than
+    `confidence` standard errors, the sampled ratio is used, otherwise the document
+    is scored fully.
+    """
+
+    def __init__(
+        self, unk_threshold=0.05, sample_windows=0, window_size=8192, confidence=3.0
+    ):
+        if sample_windows == 1:
+            raise ValueError("sample_windows should be 0 (no sampling) or at least 2")
+
         self.tokenizer = Tokenizer.from_file(tokenizer_path)
         self.unk_threshold = unk_threshold
         self.unk_id = self.tokenizer.token_to_id(self.tokenizer.model.unk_token)
+        self.sample_windows = sample_windows
+        self.window_size = window_size
+        self.confidence = confidence
 
-    def get_unk_ratios(self, lines: List[str]) -> np.ndarray:
+    def get_windows(self, line: str) -> List[str]:
         """
-        Get the unk ratio for each line in lines.
+        Returns sample_windows evenly spaced windows of line, without cut words.
         """
-        unk_ratios = np.array(
+        windows = []
+        step = len(line) / self.sample_windows
+        for i in range(self.sample_windows):
+            start = int((i + 0.5) * step - self.window_size / 2)
+            end = start + self.window_size
+            cut_start, cut_end = line.find(" ", start, end), line.rfind(" ", start, end)
+            if cut_start < cut_end:
+                start, end = cut_start + 1, cut_end
+            windows.append(line[start:end])
+        return windows
+
+    def get_sampled_unk_ratios(self, lines: List[str]) -> np.ndarray:
+        """
+        Get the unk ratio of the sampled windows of each line in lines, or NaN
+        for the lines where it does not clearly decide the threshold.
+        """
+        windows = [window for line in lines for window in self.get_windows(line)]
+        counts = np.array(
             [
-                sum(1 for t in x.ids if t == self.unk_id) / len(x)
-                for x in self.tokenizer.encode_batch(lines)
-            ]
+                (len(x), np.count_nonzero(np.array(x.ids) == self.unk_id))
+                for x in self.tokenizer.encode_batch(windows)
+            ],
+            dtype=np.float64,
+        ).reshape(len(lines), self.sample_windows, 2)
+
+        tokens, unks = counts[..., 0], counts[..., 1]
+        unk_ratios = unks.sum(axis=1) / np.maximum(tokens.sum(axis=1), 1)
+
+        # Standard error of the ratio from the spread of the windows, with the
+        # binomial error of all sampled tokens as a lower bound
+        window_ratios = unks / np.maximum(tokens, 1)
+        stderr = np.maximum(
+            window_ratios.std(axis=1, ddof=1) / np.sqrt(self.sample_windows),
+            np.sqrt(unk_ratios * (1 - unk_ratios) / np.maximum(tokens.sum(axis=1), 1)),
         )
+        clear = np.abs(unk_ratios - self.unk_threshold) > self.confidence * stderr
+        unk_ratios[~clear] = np.nan
+        return unk_ratios
+
+    def get_unk_ratios(self, lines: List[str]) -> np.ndarray:
+        """
+        Get the unk ratio for each line in lines, sampling the long lines
+        if sample_windows > 0.
+        """
+        unk_ratios = np.full(len(lines), np.nan)
+        if self.sample_windows > 0:
+            sampled = [
+                i
+                for i, line in enumerate(lines)
+                if len(line) > 2 * self.sample_windows * self.window_size
+            ]
+            if sampled:
+                unk_ratios[sampled] = self.get_sampled_unk_ratios(
+                    [lines[i] for i in sampled]
+                )
+
+        # Fully score the short lines and the undecided long ones
+        remaining = np.flatnonzero(np.isnan(unk_ratios))
+        if len(remaining) > 0:
+            unk_ratios[remaining] = self.get_full_unk_ratios(
+                [lines[i] for i in remaining]
+            )
+        return unk_ratios
+
+    def get_full_unk_ratios(self, lines: List[str], prefix_size=1 << 19) -> np.ndarray:
+        """
+        Get the unk ratio of the first max_length tokens of each line in lines.
+        """
+        encodings = encode_prefixes(self.tokenizer, lines, prefix_size)
+        unk_ratios = np.zeros(len(lines))
+        for i, encoding in enumerate(encodings):
+            ids = np.array(encoding.ids, dtype=np.int64)
+            unk_ratios[i] = np.count_nonzero(ids == self.unk_id) / max(len(ids), 1)
         return unk_ratios
 
     def __call__(self, lines: Union[List[str], np.ndarray]) -> np.ndarray:
@@ -42,21 +153,24 @@ class LanguageFilter:
 
 
 class RedundancyFilter:
-    def __init__(self, threshold=0.25):
+    def __init__(self, threshold=0.25, num_threads=None):
         self.spm = sentencepiece.SentencePieceProcessor(spm_path)
         self.threshold = threshold
+        # Threads used by sentencepiece to encode a batch, None for its default.
+        self.encode_kwargs = {} if num_threads is None else {"num_threads": num_threads}
+        if hasattr(self.spm, "EncodeAsNumpy"):
+            # Only the number of tokens is needed: get an array of ids per line
+            # rather than a list of Python ints (newer versions of sentencepiece)
+            self.encode_kwargs["out_type"] = "numpy"
 
     def get_token_char_ratio(self, lines: List[str]) -> np.ndarray:
         """
         Get the token/character ratio for each line in lines.
         """
-        ratios = np.array(
-            [
-                len(tokens) / len(chars)
-                for tokens, chars in zip(self.spm.encode(lines), lines)
-            ]
-        )
-        return ratios
+        tokens = self.spm.encode(list(lines), **self.encode_kwargs)
+        num_tokens = np.fromiter(map(len, tokens), dtype=np.float64, count=len(tokens))
+        num_chars = np.fromiter(map(len, lines), dtype=np.float64, count=len(tokens))
+        return num_tokens / num_chars
 
     def __call__(self, lines: Union[List[str], np.ndarray]) -> np.ndarray:
         """
@@ -69,3 +183,135 @@ class RedundancyFilter:
 
         ratios = self.get_token_char_ratio(lines)
         return lines[ratios < self.threshold]
+
+
+THRESHOLD_SPEC = re.compile(r"\s*(\w+)\s*(<=|>=)\s*([-+.\deE]+)\s*")
+
+
+def parse_thresholds(spec: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parses comma separated bounds of the signals of QualityScorer, such as
+    "duplicate_line_fraction<=0.3,mean_word_length>=3,mean_word_length<=10",
+    into a signal -> (low, high) dict.
+    """
+    thresholds = {}
+    for bound in spec.split(","):
+        match = THRESHOLD_SPEC.fullmatch(bound)
+        if match is None or match.group(1) not in QualityScorer.SIGNALS:
+            raise ValueError("Invalid quality threshold {!r}".format(bound))
+        signal, operator, value = match.groups()
+        low, high = thresholds.get(signal, (-np.inf, np.inf))
+        if operator == "<=":
+            high = float(value)
+        else:
+            low = float(value)
+        thresholds[signal] = (low, high)
+    return thresholds
+
+
+class QualityScorer:
+    """
+    Scores documents on several quality signals computed from a single pass of the
+    word tokenizer (BERT pre-tokenization, so punctuation marks are tokens), on the
+    first max_length tokens of each document like LanguageFilter:
+
+    - unk_ratio: ratio of unknown tokens (the unk ratio of LanguageFilter)
+    - tokens_per_char: number of tokens per character
+    - top_ngram_fraction: fraction of the tokens covered by the most repeated
+      token n-gram (0 if no n-gram is repeated)
+    - duplicate_line_fraction: fraction of the non empty lines that repeat a
+      previous line
+    - mean_word_length: mean length of the tokens with letters or digits
+
+    A document passes if each signal is within the inclusive (low, high) bounds
+    of thresholds, signals without bounds are not filtered.
+    """
+
+    SIGNALS = [
+        "unk_ratio",
+        "tokens_per_char",
+        "top_ngram_fraction",
+        "duplicate_line_fraction",
+        "mean_word_length",
+    ]
+
+    def __init__(self, thresholds: Dict[str, Tuple[float, float]] = None, ngram=2):
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.unk_id = self.tokenizer.token_to_id(self.tokenizer.model.unk_token)
+        self.ngram = ngram
+
+        # Length of each token of the vocabulary, 0 for the punctuation marks
+        vocab = self.tokenizer.get_vocab()
+        self.word_lengths = np.zeros(len(vocab), dtype=np.int64)
+        for token, token_id in vocab.items():
+            if any(c.isalnum() for c in token):
+                self.word_lengths[token_id] = len(token)
+
+        thresholds = thresholds or {}
+        for signal in thresholds:
+            if signal not in self.SIGNALS:
+                raise ValueError("Unknown quality signal {}".format(signal))
+        bounds = [thresholds.get(s, (-np.inf, np.inf)) for s in self.SIGNALS]
+        self.low = np.array([low for low, _ in bounds])
+        self.high = np.array([high for _, high in bounds])
+
+    def top_ngram_fraction(self, ids: np.ndarray) -> float:
+        n = self.ngram
+        if len(ids) <= n:
+            return 0.0
+        # Hash of each n-gram (wrapping uint64 arithmetic)
+        size, vocab_size = len(ids) - n + 1, np.uint64(len(self.word_lengths))
+        keys = np.zeros(size, dtype=np.uint64)
+        for k in range(n):
+            keys = keys * vocab_size + ids[k : k + size]
+        top = np.unique(keys, return_counts=True)[1].max()
+        if top < 2:
+            return 0.0
+        return min(1.0, top * n / len(ids))
+
+    def score(self, lines: List[str], prefix_size=1 << 19) -> np.ndarray:
+        """
+        Returns the (len(lines), len(SIGNALS)) matrix of the signals of each line.
+        """
+        scores = np.zeros((len(lines), len(self.SIGNALS)))
+        encodings = encode_prefixes(self.tokenizer, lines, prefix_size)
+        for i, (line, encoding) in enumerate(zip(lines, encodings)):
+            ids = np.array(encoding.ids, dtype=np.uint64)
+            if len(ids) == 0:
+                continue
+            # Characters covered by the encoded tokens
+            offsets = encoding.offsets
+            num_chars = offsets[-1][1] if encoding.overflowing else len(line)
+            text = line[:num_chars]
+
+            unks = np.flatnonzero(ids == self.unk_id)
+            lengths = self.word_lengths[ids.astype(np.int64)]
+            lengths[unks] = [offsets[j][1] - offsets[j][0] for j in unks]
+            words = lengths[lengths > 0]
+
+            paragraphs = [p for p in text.split("\n") if p.strip()]
+            scores[i] = (
+                len(unks) / len(ids),
+                len(ids) / max(num_chars, 1),
+                self.top_ngram_fraction(ids),
+                1 - len(set(paragraphs)) / len(paragraphs) if paragraphs else 0.0,
+                words.mean() if len(words) > 0 else 0.0,
+            )
+        return scores
+
+    def rejections(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Returns a boolean matrix of the same shape as scores, True where a signal
+        is out of its bounds.
+        """
+        return (scores < self.low) | (scores > self.high)
+
+    def __call__(self, lines: Union[List[str], np.ndarray]) -> np.ndarray:
+        """
+        Filters out lines that have a signal out of its bounds.
+        """
+        if isinstance(lines, list):
+            lines = np.array(lines, dtype=object)
+
+        scores = self.score(list(lines))
+        return lines[~self.rejections(scores).any(axis=1)]
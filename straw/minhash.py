@@ -0,0 +1,169 @@
+import os
+import json
+
+import numpy as np
+
+from typing import Tuple
+
+from straw.dedup import HashStore
+
+P = np.uint64(1099511628211)  # FNV prime, odd so that it is invertible mod 2**64
+P_INV = np.uint64(pow(int(P), -1, 1 << 64))
+Q = np.uint64(0x9E3779B97F4A7C15)
+SPACES = np.array([ord(c) for c in " \t\n\r\x0b\x0c"], dtype=np.uint8)
+
+
+def optimal_lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Returns the number of (bands, rows per band) that minimizes the sum of the
+    false positive and false negative probabilities around the Jaccard threshold.
+    """
+    s, step = np.linspace(0, 1, 1001, retstep=True)
+    below = s < threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        probability = 1 - (1 - s ** rows) ** bands
+        false_positive = probability[below].sum() * step
+        false_negative = (1 - probability[~below]).sum() * step
+        if false_positive + false_negative < best_error:
+            best, best_error = (bands, rows), false_positive + false_negative
+    return best
+
+
+class MinHasher(object):
+    """
+    Computes MinHash signatures of texts over hashed word n-grams.
+    Words are hashed with a rolling polynomial hash over the utf-8 bytes,
+    so shingling and hashing run in numpy without per-word Python loops.
+    Only the first `max_bytes` bytes of a text are shingled.
+    """
+
+    def __init__(self, num_perm=128, ngram=5, seed=1, max_bytes=1 << 20):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.max_bytes = max_bytes
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 62, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.randint(0, 1 << 62, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Returns the unique hashes of the lowercased word n-grams of text.
+        """
+        data = np.frombuffer(text.lower().encode("utf-8")[: self.max_bytes], np.uint8)
+        if len(data) == 0:
+            return np.zeros(0, dtype=np.uint64)
+
+        is_word = ~np.isin(data, SPACES)
+        edges = np.diff(np.concatenate([[False], is_word, [False]]).astype(np.int8))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return np.zeros(0, dtype=np.uint64)
+
+        with np.errstate(over="ignore"):
+            # prefix[i] = sum(data[j] * P**j for j < i), all mod 2**64
+            powers = np.empty(len(data), dtype=np.uint64)
+            powers[0], powers[1:] = 1, P
+            powers = np.cumprod(powers, dtype=np.uint64)
+            inverse_powers = np.empty(len(data), dtype=np.uint64)
+            inverse_powers[0], inverse_powers[1:] = 1, P_INV
+            inverse_powers = np.cumprod(inverse_powers, dtype=np.uint64)
+            prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+            np.cumsum(data * powers, dtype=np.uint64, out=prefix[1:])
+
+            # Position independent word hashes
+            words = (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+
+            n = min(self.ngram, len(words))
+            shingles = words[: len(words) - n + 1].copy()
+            for i in range(1, n):
+                shingles = shingles * Q + words[i : len(words) - n + 1 + i]
+
+        return np.unique(shingles)
+
+    def signature(self, text: str, block_size=4096) -> np.ndarray:
+        """
+        Returns the MinHash signature of text as num_perm uint32 values.
+        """
+        return self._min_hashes(self.shingles(text), block_size)
+
+    def _min_hashes(self, shingles: np.ndarray, block_size=4096) -> np.ndarray:
+        signature = np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            for i in range(0, len(shingles), block_size):
+                block = shingles[i : i + block_size]
+                # Multiply-shift hashing, keeping the high 32 bits
+                hashes = self.a[:, None] * block[None, :] + self.b[:, None]
+                hashes >>= np.uint64(32)
+                signature = np.minimum(signature, hashes.min(axis=1).astype(np.uint32))
+        return signature
+
+    def band_keys(self, text: str, bands: int, rows: int) -> bytes:
+        """
+        Returns one 8 byte key per LSH band of the signature of text, concatenated.
+        Texts without words have no keys: their signatures would all be equal.
+        """
+        shingles = self.shingles(text)
+        if len(shingles) == 0:
+            return b""
+        signature = self._min_hashes(shingles)[: bands * rows].astype(np.uint64)
+        signature = signature.reshape(bands, rows)
+        with np.errstate(over="ignore"):
+            keys = np.arange(bands, dtype=np.uint64) * Q
+            for i in range(rows):
+                keys = (keys ^ signature[:, i]) * P
+        return keys.astype(">u8").tobytes()
+
+
+class LSHIndex(object):
+    """
+    An LSH banding index of MinHash signatures, to find near-duplicate documents.
+
+    A document is a near-duplicate if any of its band keys was seen before. The keys
+    are kept in a HashStore, so the index persists, resumes and merges like the
+    exact hashlist. The parameters are saved next to the store in <path>.json.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        threshold=0.8,
+        num_perm=128,
+        ngram=5,
+        bloom_bits=0,
+        committed_size=None,
+    ):
+        self.path = path
+        self.params = {"threshold": threshold, "num_perm": num_perm, "ngram": ngram}
+        if path is not None and os.path.exists(path + ".json"):
+            with open(path + ".json") as f:
+                saved_params = json.load(f)
+            if saved_params != self.params:
+                raise ValueError(
+                    "LSH index {} was created with {}, got {}".format(
+                        path, saved_params, self.params
+                    )
+                )
+
+        self.bands, self.rows = optimal_lsh_params(threshold, num_perm)
+        self.store = HashStore(
+            path, digest_size=8, bloom_bits=bloom_bits, committed_size=committed_size
+        )
+
+    def add(self, keys: bytes) -> bool:
+        """
+        Adds the band keys of a document, returns False if it is a near-duplicate
+        of a document added before (in which case its keys are not added).
+        Documents without keys are never near-duplicates.
+        """
+        keys = np.frombuffer(keys, dtype=">u8")
+        if self.store.contains_many(keys).any():
+            return False
+        self.store.add_many(keys)
+        return True
+
+    def commit(self) -> int:
+        with open(self.path + ".json", "w") as f:
+            json.dump(self.params, f)
+        return self.store.commit()
@@ -1,13 +1,148 @@
+import re
+import sys
 import html
+import hashlib
 
-from typing import Union
+from collections import OrderedDict
+from typing import Callable, Dict, List, Union
 from sacremoses import MosesPunctNormalizer, MosesTokenizer, MosesDetokenizer
+from sacremoses.util import CJKChars
 
 from tokenizers.normalizers import NFKC
 
+from straw.preprocessing.cleaning import Replace, Sub, collapse_spaces
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+CJK = "".join(
+    "{}-{}".format(re.escape(chr(start)), re.escape(chr(end)))
+    for start, end in CJKChars().ranges
+)
+CURRENCY = re.escape(MosesDetokenizer.IsSc.strip())
+
+# Tokens that the english Moses detokenizer attaches to their neighbours
+# (currency and opening brackets, punctuation, quotes, contractions) and two
+# consecutive CJK words. Together with the XML escapes and hyphens that it
+# unescapes, paragraphs without any of them are only whitespace normalized by it.
+ATTACHED_TOKENS = re.compile(
+    r"\s(?:[" + CURRENCY + r"\(\[\{¿¡]+|[,.?!:;\\%}\])]+|['\"„“`]+)(?=\s|$)|\s'"
+)
+CJK_WORDS = re.compile(r"[" + CJK + r"]\s+[" + CJK + r"]")
+
+
+def has_detokenizer_artifacts(text: str) -> bool:
+    return (
+        "&" in text
+        or "@-@" in text
+        or ATTACHED_TOKENS.search(" " + text) is not None
+        or (not text.isascii() and CJK_WORDS.search(text) is not None)
+    )
+
+
+# Printable ASCII characters and sequences changed by the english punctuation rules
+# (brackets, spaces before ":;%", "''", "`", quotes before ",."), control characters
+# and non canonical spaces. NFKC and the normalization map leave the other ASCII
+# texts unchanged.
+ASCII_UNNORMALIZED = re.compile(r"[^ -~]|[()`]|  |^ | $|''| [:;%]|\"[,.]")
+
+
+def is_normalized(text: str) -> bool:
+    """
+    Returns True if the normalization does not change text (a sufficient condition).
+    """
+    return (
+        text.isascii()
+        and ASCII_UNNORMALIZED.search(text) is None
+        and not has_detokenizer_artifacts(text)
+    )
+
+
+class NormalizationCache(object):
+    """
+    A LRU cache of normalized paragraphs keyed by the blake2b digest of the paragraph,
+    holding at most max_bytes bytes of entries (estimated from the size of the str
+    objects). Paragraphs longer than max_length are not cached, as boilerplate that
+    repeats across docs (navigation, cookie notices, footers) is short.
+    """
+
+    # Size of a 16 bytes digest and of the OrderedDict entry
+    ENTRY_OVERHEAD = 160
+
+    def __init__(self, max_bytes: int, max_length=4096):
+        self.max_bytes = max_bytes
+        self.max_length = max_length
+        self.entries: "OrderedDict[bytes, str]" = OrderedDict()
+        self.size = 0
+        self.stats = dict.fromkeys(
+            ["hits", "misses", "skipped", "uncached", "evictions"], 0
+        )
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+
+    def get(self, key: bytes):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value: str):
+        self.entries[key] = value
+        self.size += sys.getsizeof(value) + self.ENTRY_OVERHEAD
+        while self.size > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= sys.getsizeof(evicted) + self.ENTRY_OVERHEAD
+            self.stats["evictions"] += 1
+
+    def pop_stats(self) -> Dict[str, int]:
+        """
+        Returns the counts of paragraphs since the last call: hits, misses, skipped
+        (already normalized), uncached (too long), and evictions.
+        """
+        stats = self.stats
+        self.stats = dict.fromkeys(stats, 0)
+        return stats
+
+
+def compile_punct_rules(punct_normalizer: MosesPunctNormalizer) -> List[Callable]:
+    """
+    Compiles the substitutions of a MosesPunctNormalizer into precompiled rules,
+    using str.replace for literal patterns and skipping the regexes when a literal
+    character of their pattern is not in the text.
+    """
+    rules = []
+    for pattern, substitution in punct_normalizer.substitutions:
+        if pattern == " +" and substitution == " ":
+            rules.append(collapse_spaces)
+            continue
+
+        parsed = list(sre_parse.parse(pattern))
+        literals = [chr(value) for op, value in parsed if op == sre_parse.LITERAL]
+        if len(literals) == len(parsed) and "\\" not in substitution:
+            rules.append(Replace(("".join(literals), substitution)))
+        else:
+            rules.append(Sub(pattern, substitution, required=(literals or [None])[0]))
+    return rules
+
 
 class TextNormalizer:
-    def __init__(self, lang="en") -> None:
+    """
+    Normalizes characters and punctuation of paragraphs, and fixes their tokenization.
+
+    With fast=True, the same normalization is computed with a single str.translate
+    of the normalization map and a single NFKC pass, precompiled punctuation rules,
+    and without detokenizing the paragraphs that have no tokenization artifacts.
+
+    With cache_size > 0, the paragraphs that are already normalized are returned as
+    they are, and the others go through a NormalizationCache of cache_size bytes.
+    """
+
+    def __init__(self, lang="en", fast=False, cache_size=0) -> None:
         self.lang = lang
         self.punct_normalizer = MosesPunctNormalizer(lang=self.lang)
         self.tokenizer = MosesTokenizer(lang=self.lang)
@@ -24,6 +159,18 @@ class TextNormalizer:
             "&rlm;": "",
         }
 
+        self.fast = fast
+        if fast:
+            self.translation = str.maketrans(
+                {k: v for k, v in self.normalization_map.items() if len(k) == 1}
+            )
+            self.entities = [
+                (k, v) for k, v in self.normalization_map.items() if len(k) > 1
+            ]
+            self.punct_rules = compile_punct_rules(self.punct_normalizer)
+
+        self.cache = NormalizationCache(cache_size) if cache_size > 0 else None
+
     def unescape_html(self, text: Union[str, list]) -> Union[str, list]:
         """Normalises HTML encoded characters i.e. (&apos;) -> (‘)"""
         if isinstance(text, str):
@@ -90,10 +237,70 @@ class TextNormalizer:
             text = [t.split() for t in text]
             return [self.detokenizer.detokenize(t) for t in text]
 
+    def fast_normalize(self, text: str) -> str:
+        """
+        Applies all preprocessing pipeline to the given string, fast path.
+        """
+        # The normalization map is applied before NFKC, as NFKC does not produce
+        # any of its characters. The entities may come from NFKC (fullwidth) forms.
+        text = self.nfkc.normalize_str(text.translate(self.translation))
+        if "&" in text:
+            replaced = text
+            for k, v in self.entities:
+                replaced = replaced.replace(k, v)
+            if replaced != text:
+                text = self.nfkc.normalize_str(replaced)
+
+        for rule in self.punct_rules:
+            text = rule(text)
+        text = text.strip()
+
+        if self.lang == "en" and not has_detokenizer_artifacts(text):
+            return " ".join(text.split())
+        return self.detokenizer.detokenize(text.split())
+
+    def cached_normalize(self, text: str) -> str:
+        """
+        Applies all preprocessing pipeline to the given string, through the cache.
+        """
+        if self.lang == "en" and is_normalized(text):
+            self.cache.stats["skipped"] += 1
+            return text
+        if len(text) > self.cache.max_length:
+            self.cache.stats["uncached"] += 1
+            return self.normalize(text)
+
+        key = self.cache.key(text)
+        normalized = self.cache.get(key)
+        if normalized is not None:
+            self.cache.stats["hits"] += 1
+            return normalized
+        self.cache.stats["misses"] += 1
+        normalized = self.normalize(text)
+        self.cache.put(key, normalized)
+        return normalized
+
+    def normalize(self, text: str) -> str:
+        if self.fast:
+            return self.fast_normalize(text)
+        return self.fix_tokenized(
+            self.moses_punct_normalize(self.special_normalize(text))
+        )
+
     def __call__(self, text: Union[str, list]) -> Union[str, list]:
         """
         Applies all preprocessing pipeline to the given string or list of strings.
         """
+        if self.cache is not None:
+            if isinstance(text, str):
+                return self.cached_normalize(text)
+            return [self.cached_normalize(t) for t in text]
+
+        if self.fast:
+            if isinstance(text, str):
+                return self.fast_normalize(text)
+            return [self.fast_normalize(t) for t in text]
+
         text = self.special_normalize(text)
         text = self.moses_punct_normalize(text)
         text = self.fix_tokenized(text)
@@ -0,0 +1,385 @@
+import gc
+import json
+import itertools
+import multiprocessing as mp
+
+import numpy as np
+
+from typing import Any, Dict, List, Optional
+
+from tqdm import tqdm
+
+from straw.codec import json_dumps, json_loads
+from straw.streams import open_input, open_output
+
+
+def get_text(doc: Any) -> str:
+    """
+    Returns the text of a decoded doc, a json string or an object with a "text" field.
+    """
+    return doc if isinstance(doc, str) else doc["text"]
+
+
+def set_text(doc: Any, text: str) -> Any:
+    """
+    Returns a copy of a decoded doc with the given text.
+    """
+    return text if isinstance(doc, str) else dict(doc, text=text)
+
+
+def get_subset(doc: Any) -> Optional[str]:
+    if isinstance(doc, dict):
+        return doc.get("meta", {}).get("pile_set_name")
+    return None
+
+
+class Stage(object):
+    """
+    A step of a Pipeline, applied by the workers to batches of decoded docs (json
+    strings, or objects with a "text" field and the Pile "meta" field). Filters
+    return the docs they keep, other stages return new docs.
+
+    The models of a stage are loaded by load(), once per process: in the main process
+    before the workers are forked, or in each worker with the other start methods.
+    """
+
+    def load(self):
+        pass
+
+    def __call__(self, docs: List[Any]) -> List[Any]:
+        raise NotImplementedError
+
+
+class SubsetFilter(Stage):
+    """
+    Keeps the docs of the given Pile subsets (comma separated).
+    """
+
+    def __init__(self, subsets: str):
+        self.subsets = set(subsets.split(","))
+
+    def __call__(self, docs):
+        return [doc for doc in docs if get_subset(doc) in self.subsets]
+
+
+class MinLengthFilter(Stage):
+    """
+    Keeps the docs of at least min_length characters.
+    """
+
+    def __init__(self, min_length: int):
+        self.min_length = min_length
+
+    def __call__(self, docs):
+        return [doc for doc in docs if len(get_text(doc)) >= self.min_length]
+
+
+class Preprocess(Stage):
+    """
+    Applies the preprocessing of the Pile subset of each doc (the docs of other subsets
+    are dropped), its paragraphs are joined with newlines.
+    """
+
+    def __init__(self):
+        self.preprocessors = None
+
+    def load(self):
+        from straw.preprocessing import PREPROCESSORS
+
+        self.preprocessors = PREPROCESSORS
+
+    def __call__(self, docs):
+        results = []
+        for doc in docs:
+            preprocessor = self.preprocessors.get(get_subset(doc))
+            if preprocessor is not None:
+                paragraphs = preprocessor(get_text(doc))
+                results.append(set_text(doc, "\n".join(paragraphs)))
+        return results
+
+
+class Normalize(Stage):
+    """
+    Normalizes the docs with TextNormalizer, as a whole, or line by line with
+    by_line=True (to keep the paragraphs of preprocessed docs).
+    """
+
+    def __init__(self, fast=False, cache_size=0, by_line=False):
+        self.fast = fast
+        self.cache_size = cache_size
+        self.by_line = by_line
+        self.normalizer = None
+
+    def load(self):
+        from straw.normalizer import TextNormalizer
+
+        self.normalizer = TextNormalizer(
+            lang="en", fast=self.fast, cache_size=self.cache_size
+        )
+
+    def __call__(self, docs):
+        if not self.by_line:
+            texts = self.normalizer([get_text(doc) for doc in docs])
+            return [set_text(doc, text) for doc, text in zip(docs, texts)]
+        return [
+            set_text(doc, "\n".join(self.normalizer(get_text(doc).split("\n"))))
+            for doc in docs
+        ]
+
+
+class LanguageFilterStage(Stage):
+    """
+    Keeps the docs whose unk ratio is below unk_threshold, scored by LanguageFilter
+    on their first max_chars characters.
+    """
+
+    def __init__(
+        self, unk_threshold=0.05, sample_windows=0, window_size=8192, max_chars=2 ** 19
+    ):
+        self.unk_threshold = unk_threshold
+        self.sample_windows = sample_windows
+        self.window_size = window_size
+        self.max_chars = max_chars
+        self.language_filter = None
+
+    def load(self):
+        from straw.filtering import LanguageFilter
+
+        self.language_filter = LanguageFilter(
+            self.unk_threshold,
+            sample_windows=self.sample_windows,
+            window_size=self.window_size,
+        )
+
+    def __call__(self, docs):
+        unk_ratios = self.language_filter.get_unk_ratios(
+            [get_text(doc)[: self.max_chars] for doc in docs]
+        )
+        return [
+            doc for doc, ratio in zip(docs, unk_ratios) if ratio < self.unk_threshold
+        ]
+
+
+class RedundancyFilterStage(Stage):
+    """
+    Drops the docs with more than max_fraction of their windows of window characters
+    above sp_filter_ratio sentencepiece tokens per character. straw-process-pile uses
+    it with windows of min-text-length characters, see StrawProcessor.
+    """
+
+    def __init__(
+        self, sp_filter_ratio=0.3, window=1000, max_fraction=0.10, num_threads=None
+    ):
+        self.sp_filter_ratio = sp_filter_ratio
+        self.window = window
+        self.max_fraction = max_fraction
+        self.num_threads = num_threads
+        self.redundancy_filter = None
+
+    def load(self):
+        from straw.filtering import RedundancyFilter
+
+        self.redundancy_filter = RedundancyFilter(num_threads=self.num_threads)
+
+    def count_windows(self, texts: List[str]):
+        """
+        Returns the number of redundant windows and the number of windows of each
+        text, scoring the windows of all texts in one batch.
+        """
+        windows, doc_ids = [], []
+        for doc_id, text in enumerate(texts):
+            for i in range(0, len(text), self.window):
+                windows.append(text[i : i + self.window])
+                doc_ids.append(doc_id)
+
+        num_windows = np.bincount(doc_ids, minlength=len(texts))
+        if not windows:
+            return np.zeros(len(texts)), num_windows
+
+        ratios = self.redundancy_filter.get_token_char_ratio(windows)
+        redundant_windows = np.bincount(
+            doc_ids, weights=ratios > self.sp_filter_ratio, minlength=len(texts)
+        )
+        return redundant_windows, num_windows
+
+    def is_redundant(self, redundant_windows, num_windows):
+        """
+        Returns True for the texts with more than max_fraction redundant windows,
+        given their counts (of whole texts, or summed over their parts).
+        """
+        return redundant_windows / np.maximum(num_windows, 1) > self.max_fraction
+
+    def __call__(self, docs):
+        redundant = self.is_redundant(
+            *self.count_windows([get_text(doc) for doc in docs])
+        )
+        return [doc for doc, is_redundant in zip(docs, redundant) if not is_redundant]
+
+
+class QualityFilter(Stage):
+    """
+    Keeps the docs whose QualityScorer signals are within thresholds, a spec such as
+    "duplicate_line_fraction<=0.3,mean_word_length>=3" (see parse_thresholds).
+    """
+
+    def __init__(self, thresholds: str):
+        self.thresholds = thresholds
+        self.quality_scorer = None
+
+    def load(self):
+        from straw.filtering import QualityScorer, parse_thresholds
+
+        self.quality_scorer = QualityScorer(parse_thresholds(self.thresholds))
+
+    def __call__(self, docs):
+        scores = self.quality_scorer.score([get_text(doc) for doc in docs])
+        rejected = self.quality_scorer.rejections(scores).any(axis=1)
+        return [doc for doc, is_rejected in zip(docs, rejected) if not is_rejected]
+
+
+STAGES = {
+    "subsets": SubsetFilter,
+    "min_length": MinLengthFilter,
+    "preprocess": Preprocess,
+    "normalize": Normalize,
+    "filter_lang": LanguageFilterStage,
+    "filter_redundancy": RedundancyFilterStage,
+    "quality": QualityFilter,
+}
+
+
+def build_stage(config: Dict[str, Any]) -> Stage:
+    """
+    Builds a stage from its config, {"stage": name, **arguments}.
+    """
+    config = dict(config)
+    name = config.pop("stage")
+    if name not in STAGES:
+        raise ValueError(
+            "Unknown stage {}, should be one of {}".format(name, ", ".join(STAGES))
+        )
+    return STAGES[name](**config)
+
+
+def parse_stages(spec: str) -> List[Dict[str, Any]]:
+    """
+    Parses comma separated stages with colon separated arguments, such as
+    "preprocess,normalize:fast=true:by_line=true,filter_lang:unk_threshold=0.1",
+    into stage configs. Values are decoded as json, or kept as strings.
+    """
+    configs = []
+    for stage in spec.split(","):
+        name, *arguments = stage.strip().split(":")
+        config = {"stage": name}
+        for argument in arguments:
+            key, _, value = argument.partition("=")
+            try:
+                config[key] = json.loads(value)
+            except json.JSONDecodeError:
+                config[key] = value
+        configs.append(config)
+    return configs
+
+
+class Pipeline(object):
+    """
+    Chains stages over a jsonl file in a single pass: each line is decoded once, goes
+    through all the stages, and is encoded once (the lines of the docs that no stage
+    changed are written as they are).
+
+    Pipelines are built from a list of stage configs, e.g. loaded from a json file:
+
+        [{"stage": "normalize", "fast": true}, {"stage": "filter_lang"}]
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.loaded = False
+
+    @classmethod
+    def from_config(cls, configs: List[Dict[str, Any]]) -> "Pipeline":
+        return cls([build_stage(config) for config in configs])
+
+    @classmethod
+    def from_file(cls, path: str) -> "Pipeline":
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    def load(self):
+        if not self.loaded:
+            for stage in self.stages:
+                stage.load()
+            self.loaded = True
+
+    def process_lines(self, lines: List[Optional[bytes]]) -> bytes:
+        """
+        Processes a batch of json lines (None lines are skipped), returns the
+        output lines.
+        """
+        lines = [line for line in lines if line is not None]
+        docs = original_docs = [json_loads(line) for line in lines]
+        # original_docs keeps the decoded docs alive until the end of the call, so
+        # that the docs created by the stages can not reuse their ids
+        original_lines = {id(doc): line for doc, line in zip(original_docs, lines)}
+
+        for stage in self.stages:
+            if not docs:
+                break
+            docs = stage(docs)
+
+        output = []
+        for doc in docs:
+            line = original_lines.get(id(doc))
+            if line is None:
+                line = (json_dumps(doc) + "\n").encode("utf-8")
+            output.append(line)
+        return b"".join(output)
+
+    def run(
+        self,
+        input_path: str,
+        output_path: str,
+        nworkers: int,
+        chunk_size: int,
+        total_docs: Optional[int] = None,
+        desc="Processing docs",
+    ):
+        """
+        Runs the pipeline over input_path with nworkers workers, each processing
+        batches of chunk_size lines, and writes the output in the input order.
+        """
+        if mp.get_start_method() == "fork":
+            # Load the models once, shared by the workers copy-on-write
+            self.load()
+            gc.freeze()
+
+        total = total_docs // chunk_size if total_docs is not None else None
+        with open_output(output_path) as fo, open_input(input_path) as fi:
+            with mp.Pool(
+                processes=nworkers, initializer=initialize, initargs=(self,)
+            ) as pool:
+                # imap is lazy and keeps the order of the input
+                outputs = pool.imap(
+                    process_lines,
+                    tqdm(
+                        itertools.zip_longest(*[fi] * chunk_size),
+                        desc=desc,
+                        total=total,
+                    ),
+                )
+                for output in outputs:
+                    fo.write(output)
+
+
+# The pipeline of a worker, see Pipeline.run
+worker_pipeline = None
+
+
+def initialize(pipeline: Pipeline):
+    global worker_pipeline
+    worker_pipeline = pipeline
+    worker_pipeline.load()
+
+
+def process_lines(lines: List[Optional[bytes]]) -> bytes:
+    return worker_pipeline.process_lines(lines)
@@ -2,13 +2,24 @@ from .books3 import process_books3
 from .gutenberg import process_gutenberg
 from .webcrawl import process_webcrawls
 from .wiki import process_wiki
-from .utils import process_jsonl, naive_sentence_split
+from .utils import process_jsonl, naive_sentence_split, SentenceIndex
+
+# The preprocessing of each supported Pile subset
+PREPROCESSORS = {
+    "Books3": process_books3,
+    "Gutenberg (PG-19)": process_gutenberg,
+    "OpenWebText2": process_webcrawls,
+    "Pile-CC": process_webcrawls,
+    "Wikipedia (en)": process_wiki,
+}
 
 __all__ = [
+    "PREPROCESSORS",
     "process_books3",
     "process_gutenberg",
     "process_jsonl",
     "process_webcrawls",
     "process_wiki",
     "naive_sentence_split",
+    "SentenceIndex",
 ]
@@ -1,68 +1,69 @@
 import re
 from typing import List
-from .utils import filter_pargraphs, rstrip
-
-
-def process_books3(raw_book) -> List[str]:
-    """
-    Processes a books3 file and returns cleaned raw text.
-    """
+from .cleaning import (
+    Cleaner,
+    LineSub,
+    Replace,
+    Sub,
+    collapse_spaces,
+    strip_line_starts,
+)
+from .utils import filter_pargraphs
 
+books3_cleaner = Cleaner(
     # Remove lists
-    book = rstrip(
-        re.sub(
-            r"(^(?:\*\*).{1,100}(?:\*\*).{0,100}\n+){2,}",
-            "",
-            raw_book,
-            flags=re.MULTILINE,
-        )
-    )
-    book = rstrip(re.sub(r"(^\d.{0,100}\n+){3,}", "", book, flags=re.MULTILINE))
-    book = rstrip(re.sub(r"(^.{0,20}\n+){10,}", "\n", book, flags=re.MULTILINE))
-
+    LineSub(r"(^(?:\*\*).{1,100}(?:\*\*).{0,100}\n+){2,}", "", strip=True),
+    LineSub(r"(^\d.{0,100}\n+){3,}", ""),
+    LineSub(r"(^.{0,20}\n+){10,}", "\n"),
     # Clean encoding errors
     # Replace invalid quotes with valid ones
-    book = rstrip(re.sub(r"â[¦]", "'", book))
-    book = rstrip(re.sub(r"Ã©", "é", book))
-
+    Sub(
+        "\u00e2\u0080[\u0094\u0099\u009c\u009d\u0098\u008a\u00a6]",
+        "'",
+        required="\u00e2",
+    ),
+    Replace(("\u00c3\u00a9", "\u00e9")),
     # italics
-    book = rstrip(re.sub(r"_(.*?)_", r" \1 ", book))
-    book = rstrip(re.sub(r"\[(.*?)\]", r" \1 ", book))
-
+    Sub(r"_(.*?)_", r" \1 ", required="_", strip=True),
+    Sub(r"\[(.*?)\]", r" \1 ", required="[", strip=True),
     # Remove illustrations
-    book = rstrip(re.sub(r"^\[.*(\n.*){0,10}\]", " ", book, flags=re.MULTILINE))
-
+    LineSub(r"^\[.*(\n.*){0,10}\]", " ", required="[", strip=True),
     # Remove >
-    book = rstrip(re.sub(r"^\>", " ", book, flags=re.MULTILINE))
+    LineSub(r"^\>", " ", required=">", strip=True),
+    # Remove Headers # ## ### ..., ** Bold ** lines and chapter titles
+    LineSub(
+        r"^(?:(#){1,6}.{1,100}"
+        r"|(\*\*).{1,100}(\*\*).{0,100}"
+        r"|((C|c)hapter|CHAPTER).{1,100})$",
+        "",
+    ),
+    # Remove ** Bold ** markers
+    Replace(("**", " "), strip=True),
+)
 
-    # Remove Headers # ## ### ...
-    book = rstrip(re.sub(r"^(#){1,6}.{1,100}$", "", book, flags=re.MULTILINE))
-    book = rstrip(
-        re.sub(r"^(\*\*).{1,100}(\*\*).{0,100}$", "", book, flags=re.MULTILINE)
-    )
-    book = rstrip(
-        re.sub(r"^((C|c)hapter|CHAPTER).{1,100}$", "", book, flags=re.MULTILINE)
-    )
+chapter_splitter = re.compile(r"\n\n\n+")
 
-    # Remove ** Bold ** markers
-    book = rstrip(re.sub(r"(?:\*\*)", " ", book))
+
+def process_books3(raw_book) -> List[str]:
+    """
+    Processes a books3 file and returns cleaned raw text.
+    """
+    book = books3_cleaner(raw_book)
 
     # Split into chapters and paragraphs
-    chapters = re.compile(r"\n\n\n+", re.MULTILINE).split(book)
-    chapters = [
-        re.compile("\n", re.MULTILINE).split(chapter)
-        for chapter in chapters
-        if len(chapter) > 5
-    ]
+    chapters = chapter_splitter.split(book)
+    chapters = [chapter.split("\n") for chapter in chapters if len(chapter) > 5]
 
     # Remove redundant chapters (ratio of non alphabetics,
     # or shorter chapters maybe, contains any of the keywords)
     chapters = [list(filter(filter_pargraphs, chapter)) for chapter in chapters]
 
     # Join paragraphs
-    chapters = [rstrip("\n".join(chapter)).strip() for chapter in chapters]
+    chapters = [strip_line_starts("\n".join(chapter)).strip() for chapter in chapters]
 
     # Clean double periods
-    chapters = [rstrip(re.sub(r"\ +", " ", chapter)).strip() for chapter in chapters]
+    chapters = [
+        strip_line_starts(collapse_spaces(chapter)).strip() for chapter in chapters
+    ]
 
     return chapters
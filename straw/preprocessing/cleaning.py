@@ -0,0 +1,127 @@
+import re
+import string
+
+from typing import Callable, List, Optional, Sequence, Tuple
+
+LINE_START_SPACES = re.compile(r"\n +")
+SPACES = re.compile(r"  +")
+ASCII_LETTERS = str.maketrans("", "", string.ascii_letters)
+
+
+def strip_line_starts(text: str) -> str:
+    """
+    Removes the spaces at the beginning of each line,
+    same as re.sub(r"^ +", "", text, flags=re.MULTILINE).
+    """
+    if text.startswith(" "):
+        text = text.lstrip(" ")
+    if "\n " in text:
+        text = LINE_START_SPACES.sub("\n", text)
+    return text
+
+
+def collapse_spaces(text: str) -> str:
+    """
+    Replaces runs of spaces with a single space, same as re.sub(r"\\ +", " ", text).
+    """
+    if "  " in text:
+        text = SPACES.sub(" ", text)
+    return text
+
+
+def count_ascii_letters(text: str) -> int:
+    """
+    Returns the number of [a-zA-Z] characters in text.
+    """
+    return len(text) - len(text.translate(ASCII_LETTERS))
+
+
+class Replace(object):
+    """
+    Replaces literal strings, one str.replace pass per pair.
+    """
+
+    def __init__(self, *pairs: Tuple[str, str], strip=False):
+        self.pairs = pairs
+        self.strip = strip
+
+    def __call__(self, text: str) -> str:
+        for old, new in self.pairs:
+            text = text.replace(old, new)
+        return strip_line_starts(text) if self.strip else text
+
+
+class Sub(object):
+    """
+    A precompiled re.sub, skipped for texts that do not contain `required`
+    (a string that is part of every match). With strip=True, the spaces at the
+    beginning of lines are removed after the substitution.
+    """
+
+    def __init__(self, pattern: str, repl: str, flags=0, required=None, strip=False):
+        self.pattern = re.compile(pattern, flags)
+        self.repl = repl
+        self.required = required
+        self.strip = strip
+
+    def sub(self, text: str) -> str:
+        return self.pattern.sub(self.repl, text)
+
+    def __call__(self, text: str) -> str:
+        if self.required is None or self.required in text:
+            text = self.sub(text)
+        return strip_line_starts(text) if self.strip else text
+
+
+class LineSub(Sub):
+    """
+    A precompiled re.sub of a multiline pattern that only matches at the beginning
+    of lines (starts with ^, and a match is never directly followed by another one).
+    The pattern is searched after literal newlines, instead of being tried at
+    every position of the text.
+    """
+
+    def __init__(self, pattern: str, repl: str, flags=0, required=None, strip=False):
+        super().__init__(pattern, repl, flags | re.MULTILINE, required, strip)
+        self.line_pattern = re.compile(r"\n(?:" + pattern + ")", flags | re.MULTILINE)
+
+    def sub(self, text: str) -> str:
+        head = ""
+        match = self.pattern.match(text)
+        if match is not None:
+            head, text = match.expand(self.repl), text[match.end() :]
+        return head + self.line_pattern.sub("\n" + self.repl, text)
+
+
+class LineSearch(object):
+    """
+    A precompiled re.search for patterns whose matches start at most one newline
+    before a line containing one of `literals`. The search starts from the line of
+    the first literal, and is skipped for texts without any of them.
+    """
+
+    def __init__(self, pattern: str, literals: Sequence[str], flags=0):
+        self.pattern = re.compile(pattern, flags)
+        self.literals = literals
+
+    def search(self, text: str) -> Optional[re.Match]:
+        positions = [text.find(literal) for literal in self.literals]
+        positions = [position for position in positions if position >= 0]
+        if not positions:
+            return None
+        return self.pattern.search(text, max(text.rfind("\n", 0, min(positions)), 0))
+
+
+class Cleaner(object):
+    """
+    Applies a sequence of precompiled rules (Replace, Sub, LineSub or any
+    str -> str callable) to a text, in order.
+    """
+
+    def __init__(self, *rules: Callable[[str], str]):
+        self.rules: List[Callable[[str], str]] = list(rules)
+
+    def __call__(self, text: str) -> str:
+        for rule in self.rules:
+            text = rule(text)
+        return text
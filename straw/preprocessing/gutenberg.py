@@ -1,54 +1,76 @@
 import re
 from typing import List
-from .utils import filter_pargraphs, rstrip
+from .cleaning import (
+    Cleaner,
+    LineSearch,
+    LineSub,
+    Replace,
+    Sub,
+    collapse_spaces,
+    strip_line_starts,
+)
+from .utils import filter_pargraphs
+
+gutenberg_cleaner = Cleaner(
+    # Clean encoding errors
+    # Replace invalid quotes with valid ones
+    Sub(
+        "\u00e2\u0080[\u0094\u0099\u009c\u009d\u0098\u008a\u00a6]",
+        "'",
+        required="\u00e2",
+    ),
+    Replace(("\u00c3\u00a9", "\u00e9")),
+    # Remove illustrations
+    Sub(r"\[.*(\n.*){0,10}\]", "", required="["),
+    # italics
+    Sub(r"_(.*?)_", r" \1 ", required="_", strip=True),
+    Sub(r"\[(.*?)\]", r" \1 ", required="[", strip=True),
+    # Remove >
+    LineSub(r"^\>", " ", required=">", strip=True),
+)
+
+license_start = LineSearch(
+    r"\n.*(\*\*\*.*END OF.*\*\*\*|End.*Project Guten.*|\*THE END.\*)",
+    ["END OF", "Project Guten", "THE END"],
+    re.MULTILINE,
+)
+header_end = LineSearch(
+    r"("
+    r"\*\*\*.*START OF.*\*\*\*"
+    r"|Produced by.*"
+    r"|This etext was produced.*"
+    r"|E\-text prepared by .*"
+    r"|.*Transcribed from.*"
+    r"|.*Project Gutenberg's Etext of.*"
+    r")(\n.*){0,3}\n\n",
+    [
+        "START OF",
+        "Produced by",
+        "This etext was produced",
+        "E-text prepared by ",
+        "Transcribed from",
+        "Project Gutenberg's Etext of",
+    ],
+    re.MULTILINE,
+)
+chapter_splitter = re.compile(r"\n\n\n+|\*\ *\*\ *\*\ *\*\ *\*\ *")
+list_remover = LineSub(
+    r"(^((C|c)hapter|CHAPTER)*\ *[\dIVX]+.{0,200}\n+){3,}", "", strip=True
+)
 
 
 def process_gutenberg(raw_book) -> List[str]:
     """
     Processes a gutenberg file and returns list of cleaned paragraphs.
     """
-    # Clean encoding errors
-    # Replace invalid quotes with valid ones
-    book = re.sub(r"â[¦]", "'", raw_book)
-    book = re.sub(r"Ã©", "é", book)
-
-    # Remove illustrations
-    book = re.sub(r"\[.*(\n.*){0,10}\]", "", book)
-
-    # italics
-    book = rstrip(re.sub(r"_(.*?)_", r" \1 ", book))
-    book = rstrip(re.sub(r"\[(.*?)\]", r" \1 ", book))
-
-    # Remove >
-    book = rstrip(re.sub(r"^\>", " ", book, flags=re.MULTILINE))
+    book = gutenberg_cleaner(raw_book)
 
     # Remove license and header
-    endidx = next(
-        re.finditer(
-            r"\n.*(\*\*\*.*END OF.*\*\*\*|End.*Project Guten.*|\*THE END.\*)",
-            book,
-            re.MULTILINE,
-        ),
-        None,
-    )
+    endidx = license_start.search(book)
     book = book[: endidx.start()] if endidx else book
 
     def remove_header(book):
-        startidx = next(
-            re.finditer(
-                r"("
-                "\*\*\*.*START OF.*\*\*\*"
-                "|Produced by.*"
-                "|This etext was produced.*"
-                "|E\-text prepared by .*"
-                "|.*Transcribed from.*"
-                "|.*Project Gutenberg's Etext of.*"
-                ")(\n.*){0,3}\n\n",
-                book,
-                re.MULTILINE,
-            ),
-            None,
-        )
+        startidx = header_end.search(book)
         if startidx and startidx.end() < 10000:
             return remove_header(book[startidx.end() :])
         return book
@@ -56,42 +78,32 @@ def process_gutenberg(raw_book) -> List[str]:
     book = remove_header(book)
 
     # Split chapters
-    chapters = re.compile("\n\n\n+|\*\ *\*\ *\*\ *\*\ *\*\ *", re.MULTILINE).split(book)
+    chapters = chapter_splitter.split(book)
 
-    # Split chapters into paragraphs
-    chapters = list(map(re.compile("\n", re.MULTILINE).split, chapters))
-
-    # Fix paragraph formatting by removing word wrap.
+    # Split chapters into paragraphs, the paragraphs have no newlines
+    # left to unwrap, only surrounding whitespace is removed.
     chapters = [
         [
-            re.sub(r"(?!.{50,})\n(?=[^\n])", " ", paragraph).strip()
-            for paragraph in chapter
+            paragraph.strip()
+            for paragraph in chapter.split("\n")
             if paragraph.strip() and not paragraph.isupper()
         ]
         for chapter in chapters
     ]
 
     # Join paragraphs
-    chapters = [rstrip("\n".join(chapter)).strip() for chapter in chapters]
+    chapters = [strip_line_starts("\n".join(chapter)).strip() for chapter in chapters]
 
     # Remove lists
-    chapters = [
-        rstrip(
-            re.sub(
-                r"(^((C|c)hapter|CHAPTER)*\ *[\dIVX]+.{0,200}\n+){3,}",
-                "",
-                chapter,
-                flags=re.MULTILINE,
-            )
-        )
-        for chapter in chapters
-    ]
+    chapters = [list_remover(chapter) for chapter in chapters]
 
     # Remove redundant chapters (ratio of non alphabetics,
     # or shorter chapters maybe, contains any of the keywords)
     chapters = [chapter for chapter in chapters if filter_pargraphs(chapter)]
 
     # Clean whitespaces
-    chapters = [rstrip(re.sub(r"\ +", " ", chapter)).strip() for chapter in chapters]
+    chapters = [
+        strip_line_starts(collapse_spaces(chapter)).strip() for chapter in chapters
+    ]
 
     return chapters
@@ -1,8 +1,11 @@
 import re
 import json
-import itertools
 
-from typing import Callable
+import numpy as np
+
+from typing import Callable, List, Tuple
+
+from .cleaning import count_ascii_letters, strip_line_starts
 
 KEYWORDS = [
     "Transcriber's Note",
@@ -16,14 +19,14 @@ KEYWORDS = [
 
 
 def rstrip(line):
-    return re.sub(r"^ +", "", line, flags=re.MULTILINE)
+    return strip_line_starts(line)
 
 
 def filter_pargraphs(paragraph):
     return (
-        len(re.findall(r"[a-zA-Z]", paragraph)) > (len(paragraph) / 3)
+        len(paragraph) > 5
         and not any(keyword in paragraph for keyword in KEYWORDS)
-        and len(paragraph) > 5
+        and count_ascii_letters(paragraph) > (len(paragraph) / 3)
     )
 
 
@@ -38,24 +41,70 @@ def process_jsonl(jsonline, processor: Callable) -> str:
 naive_segmenter = re.compile(r"(\.\"|\.\)|\.|\?|\!)(?![\)\'\"\.])")
 
 
+class SentenceIndex(object):
+    """
+    The end offsets of the sentences of a text, found once with the naive
+    segmenter, to split the whole text or parts of it into chunks of sentences.
+    """
+
+    def __init__(self, text: str, ends: np.ndarray = None):
+        self.text = text
+        if ends is None:
+            ends = np.fromiter(
+                (match.end() for match in naive_segmenter.finditer(text)), np.int64
+            )
+        self.ends = ends
+
+    def chunk_spans(self, max_len: int, start=0, end=None) -> List[Tuple[int, int]]:
+        """
+        Greedily packs the sentences of text[start:end] into (start, end) spans
+        of less than max_len characters. Sentences that do not fit are cut into
+        spans of max_len characters. As with the original naive_sentence_split, the
+        remainder after the last sentence end is a span of its own, even if it fits.
+        """
+        end = len(self.text) if end is None else end
+        spans = []
+        while start < end:
+            # The last sentence end that fits in the chunk
+            i = np.searchsorted(self.ends, min(start + max_len, end + 1), "left") - 1
+            cut = (
+                int(self.ends[i])
+                if i >= 0 and self.ends[i] > start
+                else min(start + max_len, end)
+            )
+            spans.append((start, cut))
+            start = cut
+        return spans
+
+    def strip_span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Returns the span without its leading and trailing whitespace.
+        """
+        span = self.text[start:end]
+        stripped = span.strip()
+        if not stripped:
+            return start, start
+        start += len(span) - len(span.lstrip())
+        return start, start + len(stripped)
+
+    def select(self, spans: List[Tuple[int, int]]) -> "SentenceIndex":
+        """
+        Returns the index of the spans of the text joined with newlines,
+        keeping the sentence ends that are inside the spans.
+        """
+        texts, ends, offset = [], [], 0
+        for start, end in spans:
+            lo = np.searchsorted(self.ends, start, side="right")
+            hi = np.searchsorted(self.ends, end, side="right")
+            texts.append(self.text[start:end])
+            ends.append(self.ends[lo:hi] - start + offset)
+            offset += end - start + 1
+        ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+        return SentenceIndex("\n".join(texts), ends)
+
+    def split(self, max_len: int) -> List[str]:
+        return [self.text[s:e].strip() for s, e in self.chunk_spans(max_len)]
+
+
 def naive_sentence_split(line, max_len):
-    current_position, segments = 0, []
-    sentence_iterator = naive_segmenter.finditer(line)
-
-    while current_position < len(line):
-        *_, end_position = itertools.chain(
-            [None,],
-            itertools.takewhile(
-                lambda x: x.end() - current_position < max_len, sentence_iterator
-            ),
-        )
-        segments.append(
-            line[
-                current_position : end_position.end() if end_position else (current_position + max_len)
-            ].strip()
-        )
-        current_position = (
-            end_position.end() if end_position else (current_position + max_len)
-        )
-
-    return segments
+    return SentenceIndex(line).split(max_len)
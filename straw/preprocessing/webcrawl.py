@@ -1,46 +1,54 @@
 import re
 from typing import List
 
-from .utils import filter_pargraphs, rstrip
+from .cleaning import (
+    Cleaner,
+    LineSub,
+    Replace,
+    Sub,
+    collapse_spaces,
+    strip_line_starts,
+)
+from .utils import filter_pargraphs
 
 reg = re.compile(
     r"[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)|https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)"
 )
 
 
-def process_webcrawls(raw_text) -> List[str]:
-    """
-    Processes a webcrawled text and returns list of cleaned paragraphs.
-    """
+webcrawl_cleaner = Cleaner(
     # italics
-    text = rstrip(re.sub(r"_(.*?)_", r" \1 ", raw_text))
-    text = rstrip(re.sub(r"\[(.*?)\]", r" \1 ", text))
-
+    Sub(r"_(.*?)_", r" \1 ", required="_", strip=True),
+    Sub(r"\[(.*?)\]", r" \1 ", required="[", strip=True),
     # Remove >
-    text = rstrip(re.sub(r"^\>", " ", text, flags=re.MULTILINE))
-
+    LineSub(r"^\>", " ", required=">", strip=True),
     # Remove ** Bold ** markers
-    text = rstrip(re.sub(r"(?:\*\*)", " ", text))
-
+    Replace(("**", " "), strip=True),
     # Clean
-    text = rstrip(reg.sub(" ", text))
+    Sub(reg.pattern, " ", required=".", strip=True),
+)
+
+chapter_splitter = re.compile(r"\n\n+")
+
+
+def process_webcrawls(raw_text) -> List[str]:
+    """
+    Processes a webcrawled text and returns list of cleaned paragraphs.
+    """
+    text = webcrawl_cleaner(raw_text)
 
     # Split into chapters and paragraphs
-    chapters = re.compile(r"\n\n+", re.MULTILINE).split(text)
-    chapters = [
-        re.compile("\n", re.MULTILINE).split(chapter)
-        for chapter in chapters
-        if len(chapter) > 5
-    ]
+    chapters = chapter_splitter.split(text)
+    chapters = [chapter.split("\n") for chapter in chapters if len(chapter) > 5]
 
     # Remove redundant chapters (ratio of non alphabetics,
     # or shorter chapters maybe, contains any of the keywords)
     chapters = [list(filter(filter_pargraphs, chapter)) for chapter in chapters]
 
     # Join paragraphs
-    chapters = [rstrip("\n".join(chapter)).strip() for chapter in chapters]
+    chapters = [strip_line_starts("\n".join(chapter)).strip() for chapter in chapters]
 
     # Clean double periods
-    chapters = [rstrip(re.sub(r"\ +", " ", chapter)) for chapter in chapters]
+    chapters = [strip_line_starts(collapse_spaces(chapter)) for chapter in chapters]
 
     return chapters
@@ -0,0 +1,121 @@
+import time
+
+from typing import Dict, Optional
+
+
+class Profiler(object):
+    """
+    Collects the wall time, the number of calls and the input and output sizes
+    (bytes of json lines, characters of texts) of the stages of a pipeline, and
+    counts docs per event (e.g. the filter that rejected them) and subset.
+
+    Stages are timed with t = profiler.start() and profiler.stop(stage, t, ...).
+    A disabled profiler only returns from these calls, sizes that take a pass
+    over the data to compute are only computed if profiler.enabled. Workers send
+    their stats with pop() and the parent adds them up with merge().
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages: Dict[str, list] = {}  # stage -> [seconds, calls, in, out]
+        self.counts: Dict[str, Dict[str, int]] = {}  # event -> subset -> docs
+
+    def start(self) -> float:
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage: str, start: float, size_in=0, size_out=0):
+        """
+        Records a call of stage, started at start (returned by self.start()).
+        """
+        if not self.enabled:
+            return
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = [0.0, 0, 0, 0]
+        stats[0] += time.perf_counter() - start
+        stats[1] += 1
+        stats[2] += size_in
+        stats[3] += size_out
+
+    def count(self, event: str, subset: str, docs=1):
+        if self.enabled and docs:
+            subsets = self.counts.setdefault(event, {})
+            subsets[subset] = subsets.get(subset, 0) + docs
+
+    def pop(self) -> Optional[dict]:
+        """
+        Returns the stats collected since the last call, None if disabled.
+        """
+        if not self.enabled:
+            return None
+        stats = {"stages": self.stages, "counts": self.counts}
+        self.stages, self.counts = {}, {}
+        return stats
+
+    def merge(self, stats: Optional[dict]):
+        """
+        Adds the stats returned by pop() of another profiler.
+        """
+        if not stats:
+            return
+        for stage, (seconds, calls, size_in, size_out) in stats["stages"].items():
+            totals = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+            totals[0] += seconds
+            totals[1] += calls
+            totals[2] += size_in
+            totals[3] += size_out
+        for event, subsets in stats["counts"].items():
+            for subset, docs in subsets.items():
+                self.count(event, subset, docs)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {
+                stage: {
+                    "seconds": round(seconds, 3),
+                    "calls": calls,
+                    "size_in": size_in,
+                    "size_out": size_out,
+                }
+                for stage, (seconds, calls, size_in, size_out) in self.stages.items()
+            },
+            "counts": self.counts,
+        }
+
+    def summary(self) -> str:
+        """
+        Returns a table of the stages and a table of the doc counts per subset.
+        The time of a stage is summed over the workers.
+        """
+        total = sum(stats[0] for stats in self.stages.values()) or 1.0
+        lines = [
+            "{:<16}{:>10}{:>7}{:>10}{:>11}{:>11}{:>9}".format(
+                "stage", "time (s)", "%", "calls", "in (MB)", "out (MB)", "MB/s"
+            )
+        ]
+        for stage, (seconds, calls, size_in, size_out) in self.stages.items():
+            lines.append(
+                "{:<16}{:>10.2f}{:>7.1f}{:>10}{:>11.2f}{:>11.2f}{:>9.2f}".format(
+                    stage,
+                    seconds,
+                    100 * seconds / total,
+                    calls,
+                    size_in / 1e6,
+                    size_out / 1e6,
+                    size_in / 1e6 / seconds if seconds > 0 else 0.0,
+                )
+            )
+
+        subsets = sorted({s for counts in self.counts.values() for s in counts})
+        if subsets:
+            width = max([16] + [len(event) + 1 for event in self.counts])
+            lines.append("")
+            lines.append(
+                "docs".ljust(width) + "".join("{:>20}".format(s) for s in subsets)
+            )
+            for event, counts in self.counts.items():
+                lines.append(
+                    event.ljust(width)
+                    + "".join("{:>20}".format(counts.get(s, 0)) for s in subsets)
+                )
+        return "\n".join(lines)
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+
+from typing import Dict, List
+
+from straw.streams import get_compression
+
+
+def shard_path(path: str, index: int) -> str:
+    """
+    Returns the path of the index-th part of an output file,
+    e.g. output.part-0003.jsonl.zst for output.jsonl.zst.
+    """
+    root, compression_ext = path, ""
+    if get_compression(path) is not None:
+        root, compression_ext = os.path.splitext(path)
+    root, ext = os.path.splitext(root)
+    return "{}.part-{:04d}{}{}".format(root, index, ext, compression_ext)
+
+
+def manifest_path(path: str) -> str:
+    return path + ".manifest.json"
+
+
+def write_manifest(path: str, part_docs: Dict[str, int]) -> dict:
+    """
+    Writes the manifest of the parts of the output file path, listing the number of
+    docs and bytes of each part (relative to the directory of the manifest).
+    """
+    parts = [
+        {
+            "path": os.path.basename(part_path),
+            "docs": docs,
+            "bytes": os.path.getsize(part_path),
+        }
+        for part_path, docs in sorted(part_docs.items())
+    ]
+    manifest = {
+        "output": os.path.basename(path),
+        "docs": sum(part["docs"] for part in parts),
+        "parts": parts,
+    }
+    tmp_path = manifest_path(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(path))
+    return manifest
+
+
+def read_manifest(path: str) -> List[str]:
+    """
+    Returns the paths of the parts listed in a manifest, in order.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(path)
+    return [os.path.join(directory, part["path"]) for part in manifest["parts"]]
+
+
+def _copy(src, dst, block_size=1 << 24):
+    if hasattr(os, "copy_file_range"):
+        try:
+            # Copies inside the kernel, without reading the data in Python
+            while os.copy_file_range(src.fileno(), dst.fileno(), block_size) > 0:
+                pass
+            return
+        except OSError:
+            pass  # e.g. not supported by the file system, copy the rest below
+    shutil.copyfileobj(src, dst, block_size)
+
+
+def merge_shards(output_path: str, part_paths: List[str]) -> int:
+    """
+    Concatenates the parts into output_path and returns its size. Compressed parts
+    are concatenated as they are, since concatenated zstd frames, gzip members and
+    xz streams decompress to the concatenation of their contents.
+    """
+    compression = get_compression(output_path)
+    for part_path in part_paths:
+        if get_compression(part_path) != compression:
+            raise ValueError(
+                "{} does not have the compression of {}".format(part_path, output_path)
+            )
+
+    with open(output_path, "wb") as dst:
+        for part_path in part_paths:
+            with open(part_path, "rb") as src:
+                _copy(src, dst)
+        return dst.tell()
@@ -0,0 +1,230 @@
+"""
+Asyncio API to clean Pile records arriving continuously, e.g. in an ingestion service:
+
+    from straw.streaming import StreamProcessor
+    from straw_cli.main import StrawProcessor
+
+    straw_processor = StrawProcessor.from_options(fast_normalize=True)
+    async with StreamProcessor(straw_processor, nworkers=8) as stream_processor:
+        async for record in stream_processor.process(records):
+            ...  # {"subset": ..., "text": ..., "hash": ...}
+
+records is an async iterator of Pile records: dicts with the "text" and "meta" fields,
+or their json lines (str or bytes). They are grouped into batches that are processed
+by a pool of worker processes with StrawProcessor.process_records, so the cleaned
+records are the ones straw-process-pile writes with the same options (deduplication
+is left to the caller, the records keep their hash).
+"""
+import gc
+import asyncio
+import collections
+import multiprocessing as mp
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from straw.profiling import Profiler
+
+Record = Union[Dict[str, Any], str, bytes]
+
+# Marks the end of the input records
+END = object()
+
+# The processor of a worker, see StreamProcessor.start
+worker_processor = None
+
+
+def initialize(processor: Any):
+    global worker_processor
+    worker_processor = processor
+    worker_processor.initialize()
+
+
+def process_batch(records: List[Record]) -> Tuple[List[Dict[str, Any]], Optional[dict]]:
+    """
+    Processes a batch of input records in a worker, returns the cleaned records
+    and the profiler stats of the batch.
+    """
+    return worker_processor.process_records(records)
+
+
+async def read_records(records: AsyncIterator[Record], records_queue: asyncio.Queue):
+    async for record in records:
+        await records_queue.put(record)
+    await records_queue.put(END)
+
+
+class StreamProcessor(object):
+    """
+    Cleans async iterators of Pile records with a pool of nworkers processes, started
+    by start() (or by entering the processor as an async context manager) and shared
+    by the calls of process().
+
+    processor cleans the batches in the workers, e.g. a StrawProcessor built with
+    StrawProcessor.from_options(pile_subsets="Pile-CC", max_unk_ratio=0.1). It is
+    sent to the workers, which call its initialize() method once and then its
+    process_records(records) method, returning the cleaned records of a batch and
+    its profiler stats (or None), added up in self.profile. With the fork start
+    method, its load_models() method is called before starting the workers, so
+    that they share the models.
+
+    The records are sent to the workers in batches of batch_size records, or of the
+    records received within batch_timeout seconds after the first one of the batch
+    when they arrive slowly. At most max_inflight batches (2 per worker by default)
+    are processed or waiting to be consumed at a time: reading the input stalls
+    until the consumer catches up, so that memory is bounded for slow consumers.
+    """
+
+    def __init__(
+        self,
+        processor: Any,
+        nworkers: int = 8,
+        batch_size: int = 64,
+        batch_timeout: float = 0.1,
+        max_inflight: Optional[int] = None,
+        ordered: bool = False,
+    ):
+        self.processor = processor
+        self.nworkers = nworkers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.max_inflight = max_inflight or 2 * nworkers
+        self.ordered = ordered
+        self.profile = Profiler()
+        self.executor = None
+
+    def start(self):
+        if self.executor is not None:
+            return
+        if mp.get_start_method() == "fork":
+            # Load the models once, shared by the workers copy-on-write
+            self.processor.load_models()
+            gc.freeze()
+        self.executor = ProcessPoolExecutor(
+            self.nworkers,
+            mp_context=mp.get_context(),
+            initializer=initialize,
+            initargs=(self.processor,),
+        )
+
+    def close(self, wait=True):
+        """
+        Stops the workers, the batches that are not processed yet are cancelled.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Wait for the workers without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def next_batch(self, records_queue: asyncio.Queue):
+        """
+        Returns the next batch of records and whether the input ended.
+        """
+        loop = asyncio.get_running_loop()
+        record = await records_queue.get()
+        if record is END:
+            return [], True
+
+        batch = [record]
+        deadline = loop.time() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            try:
+                record = await asyncio.wait_for(
+                    records_queue.get(), max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                break
+            if record is END:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    async def process(
+        self, records: AsyncIterator[Record]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields the cleaned records of records, in the order of their batches with
+        ordered=True, else as soon as their batch is processed. Cancelling the
+        consumer or closing the iterator cancels the batches in flight.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+
+        # Bounded, reading the input waits for the batches to be sent
+        records_queue = asyncio.Queue(self.batch_size)
+        reader = asyncio.ensure_future(read_records(records, records_queue))
+        batch_task = None
+        inflight = collections.deque()
+        ended = False
+        try:
+            while True:
+                if (
+                    not ended
+                    and batch_task is None
+                    and len(inflight) < self.max_inflight
+                ):
+                    batch_task = asyncio.ensure_future(self.next_batch(records_queue))
+
+                waiting = set(inflight)
+                if batch_task is not None:
+                    waiting.add(batch_task)
+                if not reader.done():
+                    waiting.add(reader)
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(
+                    waiting, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if reader in done:
+                    reader.result()  # Raises the errors of the input iterator
+                if batch_task in done:
+                    batch, ended = batch_task.result()
+                    batch_task = None
+                    if batch:
+                        inflight.append(
+                            loop.run_in_executor(self.executor, process_batch, batch)
+                        )
+
+                if self.ordered:
+                    completed = []
+                    while inflight and inflight[0].done():
+                        completed.append(inflight.popleft())
+                else:
+                    completed = [future for future in inflight if future.done()]
+                    for future in completed:
+                        inflight.remove(future)
+
+                for future in completed:
+                    cleaned, stats = future.result()
+                    self.profile.merge(stats)
+                    for record in cleaned:
+                        yield record
+        finally:
+            reader.cancel()
+            if batch_task is not None:
+                batch_task.cancel()
+            for future in inflight:
+                if future.done() and not future.cancelled():
+                    future.exception()  # Only the first error is raised
+                else:
+                    future.cancel()
+
+
+async def process_stream(
+    records: AsyncIterator[Record], processor: Any, **kwargs
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields the cleaned records of records with a StreamProcessor of its own, see
+    StreamProcessor for the arguments.
+    """
+    async with StreamProcessor(processor, **kwargs) as stream_processor:
+        async for record in stream_processor.process(records):
+            yield record
@@ -0,0 +1,293 @@
+import io
+import os
+import gzip
+import lzma
+import zlib
+import mmap
+import queue
+import threading
+
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+COMPRESSIONS = {
+    ".zst": "zstd",
+    ".zstd": "zstd",
+    ".gz": "gzip",
+    ".xz": "xz",
+}
+
+
+def get_compression(path: str) -> Optional[str]:
+    """
+    Returns the compression codec of a file from its extension, None if plain.
+    """
+    return COMPRESSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Reading or writing .zst files requires zstandard, "
+            "install it with `pip install zstandard`."
+        ) from e
+    return zstandard
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Reads a (decompressing) stream in a background thread, so that
+    decompression overlaps with the consumer of the stream.
+    """
+
+    def __init__(self, stream: BinaryIO, block_size=1 << 20, max_blocks=32):
+        self.stream = stream
+        self.block_size = block_size
+        self.blocks = queue.Queue(maxsize=max_blocks)
+        self.buffer = memoryview(b"")
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._prefetch, daemon=True)
+        self.thread.start()
+
+    def _prefetch(self):
+        try:
+            while not self.stopped.is_set():
+                block = self.stream.read(self.block_size)
+                self._put(block)
+                if not block:
+                    break
+        except Exception as e:
+            self.error = e
+            self._put(b"")
+
+    def _put(self, block):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.buffer:
+            block = self.blocks.get()
+            if self.error is not None:
+                raise self.error
+            if not block:
+                # Keep returning EOF on subsequent reads.
+                self.blocks.put(b"")
+                return 0
+            self.buffer = memoryview(block)
+
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.stream.close()
+        super().close()
+
+
+def open_input(path: str, prefetch=True) -> BinaryIO:
+    """
+    Opens a (possibly compressed) jsonl file for reading lines as bytes.
+    The compression is picked from the file extension.
+    """
+    compression = get_compression(path)
+    if compression is None:
+        return open(path, "rb")
+
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        stream = zstandard.ZstdDecompressor(max_window_size=2 ** 31).stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    elif compression == "gzip":
+        stream = gzip.open(path, "rb")
+    else:
+        stream = lzma.open(path, "rb")
+
+    if prefetch:
+        stream = PrefetchReader(stream)
+    return io.BufferedReader(stream, buffer_size=1 << 20)
+
+
+class OutputFile(object):
+    """
+    Writes bytes to a (possibly compressed) file. Writes are copied into blocks of
+    block_size bytes (so a write may pass a memoryview that is released as soon as
+    it returns), and the blocks are compressed and written by a background
+    thread through a queue of at most max_blocks blocks, so write() blocks instead
+    of buffering without limit when the storage is slower than the producer.
+    zstd additionally uses its own `threads` workers (-1 for all cores).
+    commit() ends the current compressed frame and syncs the file to disk, so the
+    file can later be truncated to the returned offset and appended to.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        append=False,
+        level=None,
+        threads=-1,
+        block_size=1 << 20,
+        max_blocks=32,
+    ):
+        self.path = path
+        self.compression = get_compression(path)
+        self.level = level
+        self.threads = threads
+        self.block_size = block_size
+        self.file = open(path, "ab" if append else "wb")
+        self.pending = bytearray()
+        self.encoder = None
+        self.error = None
+
+        self.blocks = queue.Queue(maxsize=max_blocks)
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _new_encoder(self):
+        if self.compression == "zstd":
+            zstandard = _import_zstandard()
+            return zstandard.ZstdCompressor(
+                level=3 if self.level is None else self.level, threads=self.threads
+            ).compressobj()
+        elif self.compression == "gzip":
+            return zlib.compressobj(
+                6 if self.level is None else self.level, zlib.DEFLATED, 31
+            )
+        else:
+            return lzma.LZMACompressor(preset=6 if self.level is None else self.level)
+
+    def _drain(self):
+        while True:
+            block = self.blocks.get()
+            try:
+                if isinstance(block, bytearray):
+                    if self.compression is not None:
+                        if self.encoder is None:
+                            self.encoder = self._new_encoder()
+                        block = self.encoder.compress(block)
+                    self.file.write(block)
+                    continue
+
+                # End of the frame: commit or close
+                if self.encoder is not None:
+                    self.file.write(self.encoder.flush())
+                    self.encoder = None
+                self.file.flush()
+            except Exception as e:
+                self.error = e
+
+            if block is None:
+                break
+            block.set()
+
+    def _send(self):
+        if self.pending:
+            block, self.pending = self.pending, bytearray()
+            self.blocks.put(block)
+
+    def write(self, data: Union[bytes, memoryview]):
+        if self.error is not None:
+            raise self.error
+        self.pending += data
+        if len(self.pending) >= self.block_size:
+            self._send()
+        return len(data)
+
+    def commit(self) -> int:
+        """
+        Writes everything to disk and returns the committed size of the file.
+        """
+        self._send()
+        done = threading.Event()
+        self.blocks.put(done)
+        done.wait()
+        if self.error is not None:
+            raise self.error
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._send()
+        self.blocks.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_output(
+    path: str, append=False, level=None, threads=-1, block_size=1 << 20
+) -> OutputFile:
+    """
+    Opens a (possibly compressed) jsonl file for writing bytes.
+    The compression is picked from the file extension.
+    """
+    return OutputFile(
+        path, append=append, level=level, threads=threads, block_size=block_size
+    )
+
+
+def split_byte_ranges(path: str, range_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits an uncompressed jsonl file into newline aligned (start, end) byte ranges
+    of roughly range_size bytes, so that workers can read their own part of the file.
+    """
+    if get_compression(path) is not None:
+        raise ValueError(
+            "Byte ranges need an uncompressed input, {} is compressed".format(path)
+        )
+
+    file_size = os.path.getsize(path)
+    ranges, start = [], 0
+    with open(path, "rb") as f:
+        while start < file_size:
+            end = start + range_size
+            if end >= file_size:
+                end = file_size
+            else:
+                # Move the end of the range to the end of the current line.
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_byte_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """
+    Yields the lines of a newline aligned byte range of a file using mmap.
+    """
+    with open(path, "rb") as f:
+        if start >= end:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            position = start
+            while position < end:
+                newline = mm.find(b"\n", position, end)
+                next_position = end if newline < 0 else newline + 1
+                yield mm[position:next_position]
+                position = next_position
@@ -0,0 +1,62 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from typing import BinaryIO, List
+
+
+def start_tracker():
+    """
+    Starts the resource tracker of shared memory segments in the parent process,
+    so that forked workers register their segments with it instead of starting
+    their own trackers. Segments left by a terminated run are unlinked by it.
+    """
+    resource_tracker.ensure_running()
+
+
+class SharedRecords(object):
+    """
+    The output records (json lines) of a work unit, written by a worker to its own
+    shared memory segment. Only the name of the segment and the end offsets of the
+    records are pickled back to the parent, which writes the bytes of the records
+    it keeps to the output without decoding them, then unlinks the segment.
+    """
+
+    def __init__(self, records: List[str]):
+        encoded = [record.encode("utf-8") for record in records]
+        self.ends = np.cumsum([0] + [len(record) + 1 for record in encoded])
+        data = b"\n".join(encoded) + b"\n"
+        segment = shared_memory.SharedMemory(create=True, size=len(data))
+        segment.buf[: len(data)] = data
+        self.name = segment.name
+        segment.close()
+
+    def __len__(self):
+        return len(self.ends) - 1
+
+    def write_to(self, output: BinaryIO, keep: np.ndarray = None):
+        """
+        Writes the records for which keep is True (all by default) to output,
+        with one write per run of consecutive kept records, and releases the segment.
+        The runs are written as memoryviews of the segment: output should copy them
+        before write() returns, like files and OutputFile do.
+        """
+        keep = np.ones(len(self), dtype=bool) if keep is None else keep
+        edges = np.diff(np.concatenate([[False], keep, [False]]).astype(np.int8))
+        segment = shared_memory.SharedMemory(self.name)
+        try:
+            for start, end in zip(
+                np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+            ):
+                output.write(segment.buf[self.ends[start] : self.ends[end]])
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def release(self):
+        """
+        Releases the segment without writing the records.
+        """
+        segment = shared_memory.SharedMemory(self.name)
+        segment.close()
+        segment.unlink()
@@ -1,27 +1,6 @@
-import json
-import itertools
 import argparse
-import multiprocessing as mp
 
-from tqdm import tqdm
-from straw.filtering import LanguageFilter
-
-language_filter = LanguageFilter()
-
-
-def predict_jsonstrs(lines):
-    # Take only the first 2**19 characters,
-    # to avoid OOM errors and this is informative
-    # enough for the language filter
-    docs = []
-    for l in lines:
-        if l is not None:
-            docs.append(json.loads(l)[: 2 ** 19])
-
-    # Predict the language of the documents
-    predictions = language_filter(docs)
-    lines = lines[: len(docs)]
-    return [l for l, p in zip(lines, predictions) if p]
+from straw.pipeline import LanguageFilterStage, Pipeline
 
 
 def cli_main():
@@ -32,12 +11,14 @@ def cli_main():
     )
 
     argparser.add_argument(
-        "--input-jsonl", type=str, help="Path of the jsonl file containing docs.",
+        "--input-jsonl",
+        type=str,
+        help="Path of the jsonl file containing docs (.zst, .gz and .xz are decompressed on the fly).",
     )
     argparser.add_argument(
         "--output-jsonl",
         type=str,
-        help="Directory to save the output in the same format as the input.",
+        help="Path to save the output in the same format as the input (.zst, .gz and .xz are compressed on the fly).",
     )
     argparser.add_argument(
         "--nworkers", type=int, default=8, help="Number of workers",
@@ -45,6 +26,24 @@ def cli_main():
     argparser.add_argument(
         "--chunksize", type=int, default=8, help="Number of docs to process per worker",
     )
+    argparser.add_argument(
+        "--unk-threshold",
+        type=float,
+        default=0.05,
+        help="Maximum ratio of unknown tokens to keep a doc",
+    )
+    argparser.add_argument(
+        "--sample-windows",
+        type=int,
+        default=0,
+        help="Score long docs on this many evenly spaced windows first, and fully only when the unk ratio is borderline (0 to always score fully)",
+    )
+    argparser.add_argument(
+        "--window-size",
+        type=int,
+        default=8192,
+        help="Size of the windows sampled by --sample-windows (in characters)",
+    )
     argparser.add_argument(
         "--total-docs",
         type=int,
@@ -54,23 +53,20 @@ def cli_main():
 
     args = argparser.parse_args()
 
-    indir = args.input_jsonl
-    outdir = args.output_jsonl
-    nworkers = args.nworkers
-    chunk_size = args.chunksize
-    total_docs = args.total_docs // chunk_size if args.total_docs is not None else None
-
-    with open(outdir, "w") as fo, open(indir) as fi:
-        with mp.Pool(processes=nworkers) as pool:
-            # We use imap instead of map because imap is lazy
-            # and can keep the order of the input.
-            processors_iter = pool.imap(
-                predict_jsonstrs,
-                tqdm(
-                    itertools.zip_longest(*[fi] * chunk_size),
-                    desc="Filtering docs",
-                    total=total_docs,
-                ),
+    pipeline = Pipeline(
+        [
+            LanguageFilterStage(
+                args.unk_threshold,
+                sample_windows=args.sample_windows,
+                window_size=args.window_size,
             )
-            for books in processors_iter:
-                fo.write("".join(books))
+        ]
+    )
+    pipeline.run(
+        args.input_jsonl,
+        args.output_jsonl,
+        args.nworkers,
+        args.chunksize,
+        total_docs=args.total_docs,
+        desc="Filtering docs",
+    )
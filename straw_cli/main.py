@@ -1,22 +1,44 @@
+import gc
+import copy
+import os
+import sys
 import json
+import time
+import heapq
+import queue
+import signal
 import argparse
+import threading
 import contextlib
 import itertools
 import hashlib
 
+import numpy as np
 import multiprocessing as mp
 
+from multiprocessing.util import Finalize
 from tqdm import tqdm
 
-from straw.normalizer import TextNormalizer
-from straw.filtering import LanguageFilter, RedundancyFilter
-from straw.preprocessing import (
-    process_gutenberg,
-    process_books3,
-    process_webcrawls,
-    process_wiki,
-    naive_sentence_split,
+from straw.checkpoint import Checkpoint
+from straw.columnar import FORMATS, ColumnarWriter
+from straw.codec import json_dumps, json_loads, peek_string
+from straw.profiling import Profiler
+from straw.dedup import HashStore
+from straw.minhash import LSHIndex, MinHasher, optimal_lsh_params
+from straw.streams import (
+    get_compression,
+    open_input,
+    open_output,
+    read_byte_range,
+    split_byte_ranges,
 )
+from straw.transport import SharedRecords, start_tracker
+from straw.shards import shard_path, manifest_path, write_manifest
+from straw.pipeline import RedundancyFilterStage
+from straw.preprocessing import PREPROCESSORS, SentenceIndex
+
+# Models of the workers, see StrawProcessor.load_models
+normalizer = language_filter = quality_scorer = redundancy_stage = minhasher = None
 
 
 class StrawProcessor(object):
@@ -24,135 +46,649 @@ class StrawProcessor(object):
         self.args = args
         self.subsets = args.pile_subsets.split(",")
 
-        self.preprocessors = {
-            "Books3": process_books3,
-            "Gutenberg (PG-19)": process_gutenberg,
-            "OpenWebText2": process_webcrawls,
-            "Pile-CC": process_webcrawls,
-            "Wikipedia (en)": process_wiki,
-        }
+        self.preprocessors = PREPROCESSORS
 
         for subset in self.subsets:
             if subset not in self.preprocessors:
                 raise ValueError("Subset {} not supported".format(subset))
 
-    def initialize(self):
+        # The redundancy filter of straw-pipeline, over windows of min-text-length
+        # characters. Its model is loaded in a copy, see load_models
+        self.redundancy_stage = RedundancyFilterStage(
+            args.sp_filter_ratio,
+            window=args.min_text_length,
+            num_threads=args.tokenizer_threads,
+        )
+
+        if args.near_dedup:
+            self.lsh_bands, self.lsh_rows = optimal_lsh_params(
+                args.near_dedup_threshold, args.minhash_perms
+            )
+
+    @classmethod
+    def from_options(cls, **options) -> "StrawProcessor":
+        """
+        Returns a processor with the given options of straw-process-pile, named like
+        their attributes in the parsed arguments (e.g. min_text_length=1000,
+        fast_normalize=True), the other options keep their default values.
+        """
+        args = parse_args([])
+        for name, value in options.items():
+            if not hasattr(args, name):
+                raise ValueError("Unknown option {}".format(name))
+            setattr(args, name, value)
+        return cls(args)
+
+    def load_models(self):
+        """
+        Loads the models used to process the docs if they are not loaded yet: once in
+        the main process before the workers are forked (they share the pages of the
+        models copy-on-write), or in each worker with the spawn and forkserver start
+        methods. The modules of the models are imported here, not to slow down --help.
+        """
         global normalizer
         global language_filter
-        global redundancy_filter
-        normalizer = TextNormalizer()
-        language_filter = LanguageFilter()
-        redundancy_filter = RedundancyFilter()
+        global quality_scorer
+        global redundancy_stage
+        global minhasher
+
+        if normalizer is not None:
+            return
+
+        from straw.normalizer import TextNormalizer
+        from straw.filtering import LanguageFilter, QualityScorer
+
+        # Threads of the tokenizers for the batches of each worker
+        if self.args.tokenizer_threads > 1:
+            os.environ["RAYON_NUM_THREADS"] = str(self.args.tokenizer_threads)
+        else:
+            os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+        normalizer = TextNormalizer(
+            fast=self.args.fast_normalize, cache_size=self.args.normalize_cache_size
+        )
+        if self.args.quality_filter is not None:
+            thresholds = dict(self.args.quality_filter)
+            thresholds.setdefault("unk_ratio", (-np.inf, self.args.max_unk_ratio))
+            quality_scorer = QualityScorer(thresholds)
+        else:
+            language_filter = LanguageFilter(
+                self.args.max_unk_ratio,
+                sample_windows=self.args.lang_sample_windows,
+                window_size=self.args.lang_window_size,
+            )
+        # Not loaded in self.redundancy_stage, the processor is pickled with the tasks
+        redundancy_stage = copy.copy(self.redundancy_stage)
+        redundancy_stage.load()
+        if self.args.near_dedup:
+            minhasher = MinHasher(self.args.minhash_perms, self.args.minhash_ngram)
+
+    def initialize(self, shard_counter=None):
+        global shard_output
+        global profiler
+
+        self.load_models()
+        profiler = Profiler(enabled=self.args.profile)
+
+        if self.args.output_mode == "shards":
+            # Each worker writes its own part, closed when the worker exits
+            with shard_counter.get_lock():
+                shard_index = shard_counter.value
+                shard_counter.value += 1
+            shard_output = open_output(
+                shard_path(self.args.output_jsonl, shard_index),
+                threads=0,  # One compression thread per worker
+                block_size=self.args.write_buffer_size,
+            )
+            Finalize(shard_output, shard_output.close, exitpriority=10)
 
-    def process(self, lines):
-        hashes, results = [], []
+    def get_lsh_keys(self, text):
+        if not self.args.near_dedup:
+            return None
+        return minhasher.band_keys(text, self.lsh_bands, self.lsh_rows)
+
+    def parse(self, lines):
+        """
+        Parses the input lines, returns the (subset, text) pairs of the docs
+        in the selected subsets that are long enough.
+        """
+        docs = []
+        start, size_in = profiler.start(), 0
         for line in lines:
-            try:
-                if line is None:
+            if line is None:
+                continue
+            if isinstance(line, dict):
+                # A decoded record, see process_records
+                json_obj = line
+            else:
+                size_in += len(line)
+
+                # Skip the docs of other subsets and the too short docs without
+                # decoding them, a text has at most as many characters as its json
+                # line has bytes
+                subset_name = peek_string(line, b"pile_set_name")
+                if subset_name is not None and subset_name not in self.subsets:
+                    profiler.count("other_subset", subset_name)
+                    continue
+                if len(line) < self.args.min_text_length:
+                    profiler.count("min_length", subset_name or "unknown")
                     continue
-                json_obj = json.loads(line)
-                subset_name = json_obj["meta"]["pile_set_name"]
-                text = json_obj["text"]
-            except json.JSONDecodeError as e:
-                print(
-                    "Couldn't parse input, please make sure a valid jsonl file from Pile is present."
-                )
-                raise e
 
-            if subset_name not in self.subsets or len(text) < self.args.min_text_length:
-                continue
+                try:
+                    json_obj = json_loads(line)
+                except json.JSONDecodeError as e:
+                    print(
+                        "Couldn't parse input, please make sure a valid jsonl file from Pile is present."
+                    )
+                    raise e
+            subset_name = json_obj["meta"]["pile_set_name"]
+            text = json_obj["text"]
 
-            # Apply language filter
-            unk_ratio = language_filter.get_unk_ratios([text])[0]
-            if unk_ratio > self.args.max_unk_ratio:
+            if subset_name not in self.subsets:
+                profiler.count("other_subset", subset_name)
+                continue
+            if len(text) < self.args.min_text_length:
+                profiler.count("min_length", subset_name)
                 continue
+            docs.append((subset_name, text))
+            profiler.count("input", subset_name)
+
+        if profiler.enabled:
+            profiler.stop("parse", start, size_in, sum(len(text) for _, text in docs))
+        return docs
+
+    def filter_quality(self, docs):
+        """
+        Scores all docs in one batch with the quality scorer (which replaces the
+        language filter), returns the docs whose signals are within the thresholds.
+        """
+        start = profiler.start()
+        rejections = quality_scorer.rejections(
+            quality_scorer.score([text for _, text in docs])
+        )
+        if profiler.enabled:
+            profiler.stop("quality_filter", start, sum(len(text) for _, text in docs))
+        for (subset_name, _), rejected in zip(docs, rejections):
+            if rejected.any():
+                signal = quality_scorer.SIGNALS[np.argmax(rejected)]
+                profiler.count("quality_" + signal, subset_name)
+        return [doc for doc, rejected in zip(docs, rejections) if not rejected.any()]
 
-            # Apply preprocessing according to subset
-            paragraphs = self.preprocessors[subset_name](text)
+    def preprocess(self, subset_name, text):
+        """
+        Applies the preprocessing of the subset, returns the paragraphs (or chapters) of the doc.
+        """
+        start = profiler.start()
+        paragraphs = self.preprocessors[subset_name](text)
+        if profiler.enabled:
+            profiler.stop(
+                "preprocess",
+                start,
+                len(text),
+                sum(len(paragraph) for paragraph in paragraphs),
+            )
+        return paragraphs
 
-            # Apply normalizer
-            paragraphs = normalizer(paragraphs)
+    def clean(self, paragraphs):
+        """
+        Normalizes and splits the preprocessed paragraphs of a doc, returns the sentence
+        index of the cleaned text, shared by the paragraph and the max length chunking.
+        """
+        # Apply normalizer
+        start = profiler.start()
+        if profiler.enabled:
+            size_in = sum(len(paragraph) for paragraph in paragraphs)
+        paragraphs = normalizer(paragraphs)
+        if profiler.enabled:
+            profiler.stop(
+                "normalize",
+                start,
+                size_in,
+                sum(len(paragraph) for paragraph in paragraphs),
+            )
+        if normalizer.cache is not None:
+            for event, paragraphs_count in normalizer.cache.pop_stats().items():
+                profiler.count("cache_" + event, "paragraphs", paragraphs_count)
 
-            # Apply sentence splitter
+        # Find the sentence boundaries of the doc once
+        start = profiler.start()
+        index = SentenceIndex("\n".join(paragraphs))
+
+        # Apply sentence splitter
+        spans, span_start = [], 0
+        for paragraph in paragraphs:
+            span_end = span_start + len(paragraph)
             if self.args.chunk_text:
-                nparagraphs = []
-                for paragraph in paragraphs:
-                    nparagraphs.extend(
-                        naive_sentence_split(paragraph, self.args.chunk_length)
-                    )
-                paragraphs = nparagraphs
+                spans.extend(
+                    index.chunk_spans(self.args.text_chunk_size, span_start, span_end)
+                )
+            else:
+                spans.append((span_start, span_end))
+            span_start = span_end + 1
 
-            paragraphs = [p for p in paragraphs if len(p) > 5]
-            text = "\n".join(paragraphs)
-            text_hash = hashlib.md5((text.encode())).hexdigest()
+        spans = [index.strip_span(*span) for span in spans]
+        index = index.select([(s, e) for s, e in spans if e - s > 5])
+        profiler.stop("split", start, len(index.text), len(index.text))
+        return index
 
-            # Filter out too short samples
-            if len(text) < self.args.min_text_length:
+    def split_parts(self, paragraphs):
+        """
+        Groups the paragraphs (or chapters) of a doc into parts of about
+        split-part-size characters.
+        """
+        parts, part, size = [], [], 0
+        for paragraph in paragraphs:
+            part.append(paragraph)
+            size += len(paragraph)
+            if size >= self.args.split_part_size:
+                parts.append(part)
+                part, size = [], 0
+        if part:
+            parts.append(part)
+        return parts
+
+    def get_chunks(self, index):
+        """
+        Returns the chunks of less than max-text-length characters of the cleaned text
+        of a doc, and the number of chunks dropped for being too short.
+        """
+        text = index.text
+        if len(text) < self.args.max_text_length:
+            return [text], 0
+        chunks = index.split(self.args.max_text_length)
+        kept = [chunk for chunk in chunks if len(chunk) >= self.args.min_text_length]
+        return kept, len(chunks) - len(kept)
+
+    def encode(self, subset_name, chunks, hashes, results, lsh_keys, as_records=False):
+        """
+        Hashes and serializes the chunks of a doc, appends them to the lists.
+        With as_records=True, the records are appended as dicts.
+        """
+        for chunk in chunks:
+            start = profiler.start()
+            chunk_hash = hashlib.md5((chunk.encode())).hexdigest()
+            hashes.append(chunk_hash)
+            lsh_keys.append(self.get_lsh_keys(chunk))
+            profiler.stop("hash", start, len(chunk))
+
+            if as_records:
+                results.append(
+                    {"subset": subset_name, "text": chunk, "hash": chunk_hash}
+                )
+                continue
+            if self.args.output_format != "jsonl":
+                # Written as columns by the main process
+                results.append((subset_name, chunk))
                 continue
 
-            # Filter out redundant samples
-            if (
-                redundancy_filter.get_token_char_ratio(
-                    [
-                        text[i : i + self.args.min_text_length]
-                        for i in range(0, len(text), self.args.min_text_length)
-                    ]
+            start = profiler.start()
+            results.append(
+                json_dumps(
+                    {
+                        "subset": subset_name,
+                        "text": chunk,
+                        "hash": chunk_hash,
+                    },
+                    ensure_ascii=False,
                 )
-                > self.args.sp_filter_ratio
-            ).mean() > 0.10:
+            )
+            profiler.stop("serialize", start, len(chunk), len(results[-1]))
+
+    def process(self, lines, split_docs=None, as_records=False):
+        """
+        Processes the docs of the input lines, returns their (hashes, results, lsh_keys)
+        or "" if no doc is kept. If split_docs is a list, the docs longer than
+        split-doc-size are not processed but appended to it as (subset, parts), see
+        SplitDocs. Lines may also be decoded records, and the results are returned
+        as record dicts with as_records=True.
+        """
+        hashes, results, lsh_keys = [], [], []
+
+        docs = self.parse(lines)
+        if not docs:
+            return ""
+
+        if self.args.quality_filter is not None:
+            docs = self.filter_quality(docs)
+        else:
+            # Apply language filter to all docs in one batch
+            start = profiler.start()
+            unk_ratios = language_filter.get_unk_ratios([text for _, text in docs])
+            if profiler.enabled:
+                profiler.stop(
+                    "language_filter", start, sum(len(text) for _, text in docs)
+                )
+            for (subset_name, _), unk_ratio in zip(docs, unk_ratios):
+                if unk_ratio > self.args.max_unk_ratio:
+                    profiler.count("language", subset_name)
+            docs = [
+                doc
+                for doc, unk_ratio in zip(docs, unk_ratios)
+                if unk_ratio <= self.args.max_unk_ratio
+            ]
+
+        # Clean docs, and filter out too short samples. The docs split into
+        # parts are cleaned by all the workers
+        cleaned = []
+        for subset_name, text in docs:
+            paragraphs = self.preprocess(subset_name, text)
+            if split_docs is not None and len(text) > self.args.split_doc_size:
+                parts = self.split_parts(paragraphs)
+                if len(parts) > 1:
+                    split_docs.append((subset_name, parts))
+                    profiler.count("split", subset_name)
+                    continue
+            cleaned.append((subset_name, self.clean(paragraphs)))
+        for subset_name, index in cleaned:
+            if len(index.text) < self.args.min_text_length:
+                profiler.count("cleaned_length", subset_name)
+        docs = [doc for doc in cleaned if len(doc[1].text) >= self.args.min_text_length]
+
+        # Filter out redundant samples
+        start = profiler.start()
+        redundant = redundancy_stage.is_redundant(
+            *redundancy_stage.count_windows([index.text for _, index in docs])
+        )
+        if profiler.enabled:
+            profiler.stop(
+                "redundancy", start, sum(len(index.text) for _, index in docs)
+            )
+
+        for (subset_name, index), is_redundant in zip(docs, redundant):
+            if is_redundant:
+                profiler.count("redundant", subset_name)
                 continue
 
             # Chunk text if too long
-            if len(text) < self.args.max_text_length:
-                results.append(
-                    json.dumps(
-                        {
-                            "subset": subset_name,
-                            "text": text,
-                            "hash": text_hash,
-                        },
-                        ensure_ascii=False,
-                    )
-                )
-                hashes.append(text_hash)
+            chunks, dropped = self.get_chunks(index)
+            profiler.count("chunks_dropped", subset_name, dropped)
 
-            else:
-                for chunk in naive_sentence_split(text, self.args.max_text_length):
-                    if len(chunk) < self.args.min_text_length:
-                        continue
-
-                    chunk_hash = hashlib.md5((chunk.encode())).hexdigest()
-                    results.append(
-                        json.dumps(
-                            {
-                                "subset": subset_name,
-                                "text": chunk,
-                                "hash": chunk_hash,
-                            },
-                            ensure_ascii=False,
-                        )
-                    )
-                    hashes.append(chunk_hash)
+            self.encode(subset_name, chunks, hashes, results, lsh_keys, as_records)
+            profiler.count("records", subset_name, len(chunks))
 
         if len(results) > 0:
-            return hashes, results
+            return hashes, results, lsh_keys
 
         return ""
 
+    def process_records(self, records):
+        """
+        Processes a batch of Pile records (dicts, or json lines as str or bytes) in a
+        worker of straw.streaming.StreamProcessor, returns the cleaned records, as
+        {"subset", "text", "hash"} dicts, and the profiler stats of the batch.
+        """
+        lines = [
+            record.encode("utf-8") if isinstance(record, str) else record
+            for record in records
+        ]
+        result = self.process(lines, as_records=True)
+        return (result[1] if result else []), profiler.pop()
 
-def cli_main():
+    def process_part(self, part):
+        """
+        Processes a DocPart: returns the (text, sentence ends) of the cleaned paragraphs
+        of a "clean" part, and the number of redundant windows, the number of windows
+        and the (hashes, results, lsh_keys) of the chunks of a "finish" part.
+        """
+        if part.step == "clean":
+            index = self.clean(part.payload)
+            return index.text, index.ends
+
+        text, chunks = part.payload
+        start = profiler.start()
+        redundant_windows, num_windows = redundancy_stage.count_windows([text])
+        profiler.stop("redundancy", start, len(text))
 
+        hashes, results, lsh_keys = [], [], []
+        self.encode(part.subset, chunks, hashes, results, lsh_keys)
+        if results and self.args.transport == "shm":
+            results = SharedRecords(results)
+        records = (hashes, results, lsh_keys) if hashes else ""
+        return int(redundant_windows[0]), int(num_windows[0]), records
+
+    def process_unit(self, work_unit):
+        """
+        Processes a (byte_range, lines) work unit, reading the (start, end)
+        byte range of the input file if lines is None, or a DocPart.
+        Returns the byte range (or the part), the result, the profiler stats
+        and the split docs of the unit.
+        """
+        if isinstance(work_unit, DocPart):
+            result = self.process_part(work_unit)
+            work_unit.payload = None
+            return work_unit, result, profiler.pop(), None
+
+        byte_range, lines = work_unit
+        if lines is None:
+            lines = read_byte_range(self.args.input_jsonl, *byte_range)
+        split_docs = [] if self.args.split_doc_size > 0 else None
+        result = self.process(lines, split_docs)
+        if result and self.args.output_mode == "shards":
+            # Only the part and the number of docs go back to the main process, not
+            # the hashes: shards mode does not deduplicate, so nothing would use them
+            hashes, results, lsh_keys = result
+            shard_output.write("\n".join(results).encode("utf-8") + b"\n")
+            result = shard_output.path, len(results)
+        elif result and self.args.transport == "shm":
+            hashes, results, lsh_keys = result
+            result = hashes, SharedRecords(results), lsh_keys
+        return byte_range, result, profiler.pop(), split_docs
+
+
+class DocPart(object):
+    """
+    A part of a doc split with --split-doc-size, processed by a worker in one of
+    two steps. "clean": the payload is a list of preprocessed paragraphs, normalized
+    and split. "finish": the payload is a (text, chunks) pair, a slice of the cleaned
+    text of the doc whose redundancy windows are scored, and chunks to encode.
+    """
+
+    def __init__(self, doc_id, step, index, subset, payload):
+        self.doc_id = doc_id
+        self.step = step
+        self.index = index
+        self.subset = subset
+        self.payload = payload
+
+
+class SplitDoc(object):
+    def __init__(self, byte_range, subset, num_parts):
+        self.byte_range = byte_range
+        self.subset = subset
+        self.results = [None] * num_parts
+        self.parts_left = num_parts
+
+
+class SplitDocs(object):
+    """
+    Processes the docs split by the workers in the main process, sending their
+    parts to the workers through the tasks queue. The cleaned parts are joined
+    in order into the cleaned text of the doc, which is chunked and sent back in
+    slices aligned to the redundancy windows, so that the filtering, the chunks
+    and their hashes are the same as when the doc is processed by one worker.
+    """
+
+    def __init__(self, straw_processor, tasks, profile):
+        self.straw_processor = straw_processor
+        self.args = straw_processor.args
+        self.tasks = tasks
+        self.profile = profile
+        self.docs = {}
+        self.next_id = 0
+
+    def add(self, byte_range, subset, parts):
+        doc_id, self.next_id = self.next_id, self.next_id + 1
+        self.docs[doc_id] = SplitDoc(byte_range, subset, len(parts))
+        for i, paragraphs in enumerate(parts):
+            self.tasks.put(DocPart(doc_id, "clean", i, subset, paragraphs))
+
+    def update(self, part, result):
+        """
+        Records the result of a part. Returns (byte_range, results) once the doc
+        is processed, results being the (hashes, results, lsh_keys) of its chunks
+        (empty if the doc is dropped), and None before.
+        """
+        doc = self.docs[part.doc_id]
+        doc.results[part.index] = result
+        doc.parts_left -= 1
+        if doc.parts_left > 0:
+            return None
+
+        if part.step == "clean" and self.finish(part.doc_id, doc):
+            return None
+        del self.docs[part.doc_id]
+        if part.step == "clean":
+            return doc.byte_range, []
+
+        redundant_windows = sum(result[0] for result in doc.results)
+        num_windows = sum(result[1] for result in doc.results)
+        results = [result[2] for result in doc.results if result[2]]
+        if self.straw_processor.redundancy_stage.is_redundant(
+            redundant_windows, num_windows
+        ):
+            self.profile.count("redundant", doc.subset)
+            for _, doc_jsons, _ in results:
+                if isinstance(doc_jsons, SharedRecords):
+                    doc_jsons.release()
+            return doc.byte_range, []
+
+        if self.profile.enabled:
+            self.profile.count("records", doc.subset, sum(len(r[0]) for r in results))
+        return doc.byte_range, results
+
+    def finish(self, doc_id, doc):
+        """
+        Joins the cleaned parts of a doc and sends its slices to the workers,
+        returns False if the doc is too short.
+        """
+        texts, ends, offset = [], [], 0
+        for text, part_ends in doc.results:
+            if text:
+                texts.append(text)
+                ends.append(part_ends + offset)
+                offset += len(text) + 1
+        ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+        index = SentenceIndex("\n".join(texts), ends)
+        if len(index.text) < self.args.min_text_length:
+            self.profile.count("cleaned_length", doc.subset)
+            return False
+
+        chunks, dropped = self.straw_processor.get_chunks(index)
+        self.profile.count("chunks_dropped", doc.subset, dropped)
+
+        # Slices of whole redundancy windows, each sent with the chunks that start in it
+        window = self.args.min_text_length
+        slice_size = max(1, self.args.split_part_size // window) * window
+        text = index.text
+        num_slices = (len(text) + slice_size - 1) // slice_size
+        slice_chunks = [[] for _ in range(num_slices)]
+        position = 0
+        for chunk in chunks:
+            slice_chunks[min(position // slice_size, num_slices - 1)].append(chunk)
+            position += len(chunk) + 1
+
+        doc.results = [None] * num_slices
+        doc.parts_left = num_slices
+        for i in range(num_slices):
+            payload = text[i * slice_size : (i + 1) * slice_size], slice_chunks[i]
+            self.tasks.put(DocPart(doc_id, "finish", i, doc.subset, payload))
+        return True
+
+
+def read_work_units(input, read_chunk_size, checkpoint=None, unit_bytes=0):
+    """
+    Groups the lines of the input into (byte_range, lines) work units of
+    read_chunk_size lines, or of about unit_bytes bytes if unit_bytes > 0 (a line of
+    unit_bytes or more gets a unit of its own), leaving out the lines completed
+    in the checkpoint.
+    """
+    start = position = size = 0
+    lines = []
+    for line in input:
+        line_start, position = position, position + len(line)
+        if checkpoint is not None and checkpoint.covers(line_start, position):
+            if not lines:
+                start = position
+            continue
+
+        if unit_bytes > 0 and len(line) >= unit_bytes and lines:
+            yield (start, line_start), lines
+            start, lines, size = line_start, [], 0
+
+        lines.append(line)
+        size += len(line)
+        full = size >= unit_bytes if unit_bytes > 0 else len(lines) == read_chunk_size
+        if full:
+            yield (start, position), lines
+            start, lines, size = position, [], 0
+
+    if lines:
+        yield (start, position), lines
+
+
+def largest_first(work_units, window):
+    """
+    Yields the work units, the largest (by byte range) of the next window units
+    first, so that the heaviest units are not the last ones to start.
+    """
+    heap = []
+    for i, work_unit in enumerate(work_units):
+        (start, end), _ = work_unit
+        heapq.heappush(heap, (start - end, i, work_unit))
+        if len(heap) >= window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def limit_inflight(work_units, slots, stopped, part_tasks=None, num_slots=0):
+    """
+    Yields the work units, taking one of the slots (a semaphore released once the
+    result of a unit is written) for each, so that the reader stalls when results
+    are not written fast enough instead of queueing them in memory.
+
+    The doc parts put in the part_tasks queue are yielded as they come without
+    taking a slot, until all the num_slots slots are released after the input.
+    """
+
+    def take_slot():
+        while True:
+            while part_tasks is not None and not part_tasks.empty():
+                yield part_tasks.get()
+            if slots.acquire(timeout=0.1):
+                return True
+            if stopped.is_set():
+                return False
+
+    for work_unit in work_units:
+        if not (yield from take_slot()):
+            return
+        yield work_unit
+
+    if part_tasks is not None:
+        for _ in range(num_slots):
+            if not (yield from take_slot()):
+                return
+
+
+def parse_args(argv=None):
+    """
+    Parses and validates the arguments of straw-process-pile (sys.argv if argv is
+    None), exits with an error message for invalid arguments.
+    """
     argparser = argparse.ArgumentParser(
         "straw-process-pile", description="Process the Pile jsonl files.",
     )
 
     argparser.add_argument(
-        "--input-jsonl", type=str, help="Path of the jsonl file containing docs.",
+        "--input-jsonl",
+        type=str,
+        help="Path of the jsonl file containing docs (.zst, .gz and .xz are decompressed on the fly).",
     )
     argparser.add_argument(
         "--output-jsonl",
         type=str,
-        help="Directory to save the output in the same format as the input.",
+        help="Path to save the output jsonl (.zst, .gz and .xz are compressed on the fly).",
     )
     argparser.add_argument(
         "--nworkers", type=int, default=8, help="Number of workers",
@@ -163,6 +699,56 @@ def cli_main():
         default=8,
         help="Number of docs to process per worker",
     )
+    argparser.add_argument(
+        "--unit-bytes",
+        type=int,
+        default=0,
+        help="""Group docs into work units of about this many bytes instead of
+        --read-chunk-size docs (docs of this size or more are processed alone)""",
+    )
+    argparser.add_argument(
+        "--dispatch-window",
+        type=int,
+        default=0,
+        help="""Send the largest of the next this many work units to the workers first,
+        so that heavy units do not finish last (ignored with --ordered)""",
+    )
+    argparser.add_argument(
+        "--split-doc-size",
+        type=int,
+        default=0,
+        help="""Split the docs longer than this many characters into parts of about
+        --split-part-size characters at the chapters/paragraphs of the subset preprocessing,
+        cleaned and scored by all the workers (0 disables it, not supported with --ordered
+        and --output-mode shards)""",
+    )
+    argparser.add_argument(
+        "--split-part-size",
+        type=int,
+        default=1024 * 1024,
+        help="Size of the parts of the docs split with --split-doc-size in characters",
+    )
+    argparser.add_argument(
+        "--read-mode",
+        type=str,
+        default="stream",
+        choices=["stream", "ranges"],
+        help="""stream: the main process reads the input and sends docs to the workers.
+        ranges: the input is split into byte ranges, and each worker reads its own ranges
+        (needs an uncompressed input).""",
+    )
+    argparser.add_argument(
+        "--range-size",
+        type=int,
+        default=16 * 1024 * 1024,
+        help="Size of the byte ranges read by the workers in bytes (--read-mode ranges)",
+    )
+    argparser.add_argument(
+        "--tokenizer-threads",
+        type=int,
+        default=1,
+        help="Number of threads used by the tokenizers of each worker for a batch of docs",
+    )
     argparser.add_argument(
         "--total-docs",
         type=int,
@@ -193,12 +779,47 @@ def cli_main():
         default=1024,
         help="Number of characters to chunk the text into",
     )
+    argparser.add_argument(
+        "--fast-normalize",
+        action="store_true",
+        help="Use the fast path of the normalizer (same output, skips detokenizing clean paragraphs)",
+    )
+    argparser.add_argument(
+        "--normalize-cache-size",
+        type=int,
+        default=0,
+        help="""Size in bytes of the LRU cache of normalized paragraphs of each worker, for
+        the boilerplate paragraphs repeated across docs. Paragraphs that are already
+        normalized skip the normalizer (0 disables both)""",
+    )
     argparser.add_argument(
         "--max-unk-ratio",
         type=float,
         default=0.1,
         help="Maximum ratio of unknown tokens to keep a sample (English only)",
     )
+    argparser.add_argument(
+        "--lang-sample-windows",
+        type=int,
+        default=0,
+        help="Score long docs on this many evenly spaced windows first, and fully only when the unk ratio is borderline (0 to always score fully)",
+    )
+    argparser.add_argument(
+        "--lang-window-size",
+        type=int,
+        default=8192,
+        help="Size of the windows sampled by --lang-sample-windows (in characters)",
+    )
+    argparser.add_argument(
+        "--quality-filter",
+        type=str,
+        default=None,
+        help="""Replace the language filter by the quality scorer, which computes the signals
+        unk_ratio, tokens_per_char, top_ngram_fraction, duplicate_line_fraction and
+        mean_word_length in one tokenization pass, and keeps the docs within the given bounds,
+        e.g. "duplicate_line_fraction<=0.3,mean_word_length>=3,mean_word_length<=10"
+        (unk_ratio<=--max-unk-ratio unless it is given)""",
+    )
     argparser.add_argument(
         "--pile-subsets",
         type=str,
@@ -214,6 +835,126 @@ def cli_main():
         If path found, hashlist will be loaded and used to deduplicate. 
         If path is empty, no deduplication will be performed.""",
     )
+    argparser.add_argument(
+        "--dedup-digest-size",
+        type=int,
+        default=8,
+        choices=[8, 16],
+        help="Number of bytes of the md5 hash kept in the hashlist (for new hashlists)",
+    )
+    argparser.add_argument(
+        "--dedup-bloom-bits",
+        type=int,
+        default=0,
+        help="Size of the Bloom filter in front of the hashlist in bits (0 disables it)",
+    )
+    argparser.add_argument(
+        "--near-dedup",
+        type=str,
+        default="",
+        help="""Path to save the MinHash LSH index used to drop near-duplicates:
+        created if not found, loaded and extended otherwise.
+        If path is empty, no near-deduplication will be performed.""",
+    )
+    argparser.add_argument(
+        "--near-dedup-threshold",
+        type=float,
+        default=0.8,
+        help="Estimated Jaccard similarity of word n-grams above which docs are near-duplicates",
+    )
+    argparser.add_argument(
+        "--minhash-perms",
+        type=int,
+        default=128,
+        help="Number of permutations of the MinHash signatures",
+    )
+    argparser.add_argument(
+        "--minhash-ngram",
+        type=int,
+        default=5,
+        help="Size of the word n-grams hashed into the MinHash signatures",
+    )
+    argparser.add_argument(
+        "--output-mode",
+        type=str,
+        default="single",
+        choices=["single", "shards"],
+        help="""single: the main process writes all the output to output-jsonl.
+        shards: each worker writes its own output-jsonl part (e.g. output.part-0000.jsonl),
+        listed in output-jsonl.manifest.json, merge them with straw-merge-shards.
+        Does not support --deduplicate, --near-dedup and checkpointing.""",
+    )
+    argparser.add_argument(
+        "--output-format",
+        type=str,
+        default="jsonl",
+        choices=["jsonl"] + FORMATS,
+        help="""jsonl: json lines with the subset, text and hex hash of each record.
+        parquet and arrow (requires pyarrow): columns with the dictionary encoded subset,
+        the text and the 16 bytes md5 digest, written by row groups (record batches of the
+        arrow IPC file format, which can be memory-mapped). Parquet row groups have
+        min/max statistics. Does not support --output-mode shards, --transport shm and
+        checkpointing.""",
+    )
+    argparser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=64 * 1024 * 1024,
+        help="Characters of text per row group with --output-format parquet and arrow",
+    )
+    argparser.add_argument(
+        "--transport",
+        type=str,
+        default="pipe",
+        choices=["pipe", "shm"],
+        help="""pipe: the workers send the output records to the main process through the pool.
+        shm: the workers write the encoded records to shared memory segments, and only their
+        offsets are sent to the main process, which writes the records without decoding them.""",
+    )
+    argparser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=None,
+        help="""Max number of work units being read, processed or waiting to be written
+        (default: 4 * nworkers). Bounds the memory used by results when the output is slow""",
+    )
+    argparser.add_argument(
+        "--ordered",
+        action="store_true",
+        help="""Write the results in the order of the input. Results that complete early
+        wait for the previous ones, at most --max-inflight work units are kept""",
+    )
+    argparser.add_argument(
+        "--write-buffer-size",
+        type=int,
+        default=8 * 1024 * 1024,
+        help="Size of the blocks written to the output by the writer thread in bytes",
+    )
+    argparser.add_argument(
+        "--profile",
+        action="store_true",
+        help="""Collect the time and sizes of the processing stages and the docs rejected
+        by each filter per subset, print them as a json line every --profile-interval seconds
+        and as a table at the end""",
+    )
+    argparser.add_argument(
+        "--profile-interval",
+        type=int,
+        default=60,
+        help="Seconds between the json lines of stats of --profile",
+    )
+    argparser.add_argument(
+        "--checkpoint-interval",
+        type=int,
+        default=0,
+        help="""Save a checkpoint to <output-jsonl>.checkpoint every this many seconds
+        (0 disables checkpointing)""",
+    )
+    argparser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the last checkpoint of the output, if there is one",
+    )
     argparser.add_argument(
         "--sp-filter-ratio",
         type=float,
@@ -221,54 +962,320 @@ def cli_main():
         help="Maximum ratio of sentencepiece tokens to text length in characters to keep a sample",
     )
 
-    args = argparser.parse_args()
+    args = argparser.parse_args(argv)
+    if args.quality_filter is not None:
+        from straw.filtering import parse_thresholds
+
+        try:
+            args.quality_filter = parse_thresholds(args.quality_filter)
+        except ValueError as e:
+            argparser.error(str(e))
+    if args.output_mode == "shards" and (
+        args.deduplicate or args.near_dedup or args.checkpoint_interval or args.resume
+    ):
+        argparser.error(
+            "--output-mode shards does not support --deduplicate, --near-dedup, "
+            "--checkpoint-interval and --resume"
+        )
+    if args.output_format != "jsonl" and (
+        args.output_mode == "shards"
+        or args.transport == "shm"
+        or args.checkpoint_interval
+        or args.resume
+    ):
+        argparser.error(
+            "--output-format {} does not support --output-mode shards, "
+            "--transport shm, --checkpoint-interval and --resume".format(
+                args.output_format
+            )
+        )
+    if args.quality_filter is not None and args.lang_sample_windows > 0:
+        argparser.error("--quality-filter does not support --lang-sample-windows")
+    if args.split_doc_size > 0 and (args.ordered or args.output_mode == "shards"):
+        argparser.error(
+            "--split-doc-size does not support --ordered and --output-mode shards"
+        )
+    if args.read_mode == "ranges" and get_compression(args.input_jsonl) is not None:
+        argparser.error(
+            "--read-mode ranges does not support a compressed --input-jsonl"
+        )
+    return args
+
+
+def cli_main():
+    args = parse_args()
+
     total_docs = (
-        args.total_docs // args.read_chunk_size if args.total_docs is not None else None
+        args.total_docs // args.read_chunk_size
+        if args.total_docs is not None and args.unit_bytes == 0
+        else None
     )
 
+    checkpoint_path = args.output_jsonl + ".checkpoint"
+    if args.resume and os.path.exists(checkpoint_path):
+        checkpoint = Checkpoint.load(checkpoint_path)
+        if checkpoint.input_path != os.path.abspath(args.input_jsonl):
+            raise ValueError(
+                "Checkpoint {} was created for {}".format(
+                    checkpoint_path, checkpoint.input_path
+                )
+            )
+        # Drop the output written after the last checkpoint
+        os.truncate(args.output_jsonl, checkpoint.output_offset)
+        print(
+            "Resuming from checkpoint, {} bytes of input already processed".format(
+                sum(end - start for start, end in checkpoint.completed)
+            )
+        )
+    else:
+        checkpoint = Checkpoint(checkpoint_path, os.path.abspath(args.input_jsonl))
+
+    if args.near_dedup:
+        lsh_index = LSHIndex(
+            args.near_dedup,
+            threshold=args.near_dedup_threshold,
+            num_perm=args.minhash_perms,
+            ngram=args.minhash_ngram,
+            bloom_bits=args.dedup_bloom_bits,
+            committed_size=checkpoint.state.get("lsh_index_size"),
+        )
+
     if args.deduplicate:
-        import os
-        import hashlib
-        import pickle
+        hashstore = HashStore(
+            args.deduplicate,
+            digest_size=args.dedup_digest_size,
+            bloom_bits=args.dedup_bloom_bits,
+            committed_size=checkpoint.state.get("hashstore_size"),
+        )
 
-        if os.path.exists(args.deduplicate):
-            with open(args.deduplicate, "rb") as f:
-                hashset = pickle.load(f)
-        else:
-            hashset = set()
+    def save_checkpoint():
+        checkpoint.output_offset = output.commit()
+        checkpoint.state["duplicates"] = duplicates
+        if args.deduplicate:
+            checkpoint.state["hashstore_size"] = hashstore.commit()
+        if args.near_dedup:
+            checkpoint.state["lsh_index_size"] = lsh_index.commit()
+        checkpoint.state["near_duplicates"] = near_duplicates
+        checkpoint.save()
 
     with contextlib.ExitStack() as stack:
-        input = stack.enter_context(open(args.input_jsonl, "r", encoding="utf-8"))
-        output = stack.enter_context(open(args.output_jsonl, "w", encoding="utf-8"))
+        if args.output_format != "jsonl":
+            output = stack.enter_context(
+                ColumnarWriter(
+                    args.output_jsonl,
+                    args.output_format,
+                    args.pile_subsets.split(","),
+                    row_group_size=args.row_group_size,
+                )
+            )
+        elif args.output_mode == "single":
+            output = stack.enter_context(
+                open_output(
+                    args.output_jsonl,
+                    append=checkpoint.output_offset > 0,
+                    block_size=args.write_buffer_size,
+                )
+            )
 
         straw_processor = StrawProcessor(args)
-        pool = mp.Pool(args.nworkers, initializer=straw_processor.initialize)
+        if args.transport == "shm":
+            start_tracker()
+        if mp.get_start_method() == "fork":
+            straw_processor.load_models()
+            # Keep the garbage collector of the workers from writing to (and
+            # copying) the pages of the objects created so far
+            gc.freeze()
+        # Numbers the parts of the workers with --output-mode shards
+        shard_counter = mp.Value("i", 0)
+        pool = mp.Pool(
+            args.nworkers,
+            initializer=straw_processor.initialize,
+            initargs=(shard_counter,),
+        )
 
-        processed_docs = pool.imap_unordered(
-            straw_processor.process,
-            itertools.zip_longest(*[input] * args.read_chunk_size),
-            chunksize=8,
+        if args.read_mode == "ranges":
+            work_units = [
+                (byte_range, None)
+                for start, end in split_byte_ranges(args.input_jsonl, args.range_size)
+                for byte_range in checkpoint.missing(start, end)
+            ]
+            total_docs = len(work_units)
+        else:
+            input = stack.enter_context(open_input(args.input_jsonl))
+            work_units = read_work_units(
+                input, args.read_chunk_size, checkpoint, args.unit_bytes
+            )
+
+        if args.dispatch_window > 1 and not args.ordered:
+            work_units = largest_first(work_units, args.dispatch_window)
+
+        # Bound the work units in flight, imap reorders the results by input order
+        # within this window with --ordered
+        max_inflight = args.max_inflight or 4 * args.nworkers
+        slots = threading.Semaphore(max_inflight)
+        stopped = threading.Event()
+        # Parts of the split docs, sent to the workers between the work units
+        part_tasks = queue.Queue() if args.split_doc_size > 0 else None
+        imap = pool.imap if args.ordered else pool.imap_unordered
+        processed_docs = imap(
+            straw_processor.process_unit,
+            limit_inflight(work_units, slots, stopped, part_tasks, max_inflight),
+            chunksize=1,
         )
+        # Whatever ends the run (e.g. an error raised by a worker), stop feeding the
+        # pool, whose task handler thread waits for slots in limit_inflight, before
+        # terminating it and closing the input
+        stack.callback(pool.terminate)
+        stack.callback(stopped.set)
+
+        # Stop gracefully on SIGTERM (e.g. SLURM time limit) after saving a checkpoint.
+        # A second SIGTERM, or one received once the loop is over, goes to the previous
+        # handler (by default, it terminates the process)
+        stop_requested = []
+
+        def request_stop(*_):
+            stop_requested.append(True)
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        previous_handler = signal.signal(signal.SIGTERM, request_stop)
+        if previous_handler is None:  # Not installed from Python
+            previous_handler = signal.SIG_DFL
+        stack.callback(signal.signal, signal.SIGTERM, previous_handler)
+
+        duplicates = checkpoint.state.get("duplicates", 0)
+        near_duplicates = checkpoint.state.get("near_duplicates", 0)
+        part_docs = {}
+        profile = Profiler(enabled=args.profile)
+        split_docs = SplitDocs(straw_processor, part_tasks, profile)
+        # Work units waiting for their split docs: byte_range -> [docs left, results]
+        pending_units = {}
+
+        def write_result(doc_jsons):
+            nonlocal duplicates, near_duplicates
+            if args.output_mode == "shards":
+                part_path, num_docs = doc_jsons
+                part_docs[part_path] = part_docs.get(part_path, 0) + num_docs
+                return
+
+            doc_hashes, doc_jsons, doc_lsh_keys = doc_jsons
+            start = profile.start()
+            keep = np.ones(len(doc_hashes), dtype=bool)
+            if args.deduplicate:
+                keep = hashstore.add_many(doc_hashes)
+                duplicates += len(keep) - int(keep.sum())
+                profile.count("duplicate", "all", len(keep) - int(keep.sum()))
+            if args.near_dedup:
+                for i in np.flatnonzero(keep):
+                    keep[i] = lsh_index.add(doc_lsh_keys[i])
+                    near_duplicates += not keep[i]
+                    profile.count("near_duplicate", "all", int(not keep[i]))
+            profile.stop("dedup", start)
+
+            start = profile.start()
+            if args.output_format != "jsonl":
+                output.write(doc_jsons, doc_hashes, keep)
+            elif isinstance(doc_jsons, SharedRecords):
+                doc_jsons.write_to(output, keep)
+            elif keep.any():
+                doc_jsons = itertools.compress(doc_jsons, keep)
+                output.write("\n".join(doc_jsons).encode("utf-8") + b"\n")
+            profile.stop("write", start)
+
+        last_checkpoint = last_profile = start_time = time.time()
+        progress = stack.enter_context(tqdm(desc="Processing docs", total=total_docs))
+        while not stop_requested:
+            if (
+                args.checkpoint_interval > 0
+                and time.time() - last_checkpoint > args.checkpoint_interval
+            ):
+                save_checkpoint()
+                last_checkpoint = time.time()
+
+            if args.profile and time.time() - last_profile > args.profile_interval:
+                stats = dict(profile.to_dict(), elapsed=round(time.time() - start_time))
+                tqdm.write(json.dumps(stats), file=sys.stderr)
+                last_profile = time.time()
+
+            try:
+                task, doc_jsons, stats, unit_split_docs = processed_docs.next(timeout=1)
+            except mp.TimeoutError:
+                continue
+            except StopIteration:
+                break
+
+            profile.merge(stats)
+            if isinstance(task, DocPart):
+                done = split_docs.update(task, doc_jsons)
+                if done is None:
+                    continue
+                byte_range, doc_results = done
+                pending = pending_units[byte_range]
+                pending[0] -= 1
+                pending[1].extend(doc_results)
+                if pending[0] > 0:
+                    continue
+                del pending_units[byte_range]
+                results = pending[1]
+            else:
+                progress.update()
+                byte_range, results = task, [doc_jsons] if doc_jsons else []
+                if unit_split_docs:
+                    # The unit is written and checkpointed with its split docs
+                    pending_units[byte_range] = [len(unit_split_docs), results]
+                    for subset, parts in unit_split_docs:
+                        split_docs.add(byte_range, subset, parts)
+                    continue
+
+            for doc_jsons in results:
+                write_result(doc_jsons)
+            checkpoint.add(*byte_range)
+            slots.release()
+        signal.signal(signal.SIGTERM, previous_handler)
 
-        duplicates = 0
-        for doc_jsons in tqdm(
-            processed_docs, desc="Processing docs", total=total_docs,
+        if args.profile:
+            progress.close()
+            print(profile.summary())
+            print("Total time: {:.1f} s".format(time.time() - start_time))
+
+        if args.output_mode == "shards":
+            stopped.set()
+            if stop_requested:
+                pool.terminate()
+                print("Stopped, the output parts are incomplete")
+                return
+
+            # Let the workers exit, which closes their parts
+            pool.close()
+            pool.join()
+            for shard_index in range(shard_counter.value):
+                part_docs.setdefault(shard_path(args.output_jsonl, shard_index), 0)
+            write_manifest(args.output_jsonl, part_docs)
+            print(
+                "Wrote {} parts, listed in {}".format(
+                    len(part_docs), manifest_path(args.output_jsonl)
+                )
+            )
+            return
+
+        if args.output_format == "jsonl" and (
+            args.checkpoint_interval > 0 or args.resume or stop_requested
         ):
-            if doc_jsons:
-                if args.deduplicate:
-                    for doc_hash, doc_json in zip(*doc_jsons):
-                        if doc_hash not in hashset:
-                            print(doc_json, file=output)
-                            hashset.add(doc_hash)
-                        else:
-                            duplicates += 1
-                else:
-                    print("\n".join(doc_jsons[1]), file=output)
+            save_checkpoint()
+        stopped.set()
+        pool.terminate()
 
-        if args.deduplicate:
-            import pickle
+        if stop_requested:
+            if args.output_format != "jsonl":
+                print("Stopped, the output is incomplete")
+            else:
+                print("Stopped, run again with --resume to continue")
+            return
 
-            with open(args.deduplicate, "wb") as f:
-                pickle.dump(hashset, f)
+        if args.deduplicate:
+            hashstore.commit()
+        if args.near_dedup:
+            lsh_index.commit()
 
     print(f"Found {duplicates} duplicates")
+    if args.near_dedup:
+        print(f"Found {near_duplicates} near-duplicates")
@@ -0,0 +1,33 @@
+import argparse
+
+from straw.dedup import merge_stores
+
+
+def cli_main():
+
+    argparser = argparse.ArgumentParser(
+        "straw-merge-hashes",
+        description="Merge the hashlists of several straw-process-pile runs into one.",
+    )
+
+    argparser.add_argument(
+        "--input-hashlists",
+        type=str,
+        nargs="+",
+        help="Paths of the hashlists to merge (hashlists of older versions are converted).",
+    )
+    argparser.add_argument(
+        "--output-hashlist", type=str, help="Path to save the merged hashlist.",
+    )
+    argparser.add_argument(
+        "--digest-size",
+        type=int,
+        default=None,
+        choices=[8, 16],
+        help="Number of bytes per hash, by default that of the first hashlist",
+    )
+
+    args = argparser.parse_args()
+
+    total = merge_stores(args.output_hashlist, args.input_hashlists, args.digest_size)
+    print(f"Merged {len(args.input_hashlists)} hashlists, {total} unique hashes")
@@ -0,0 +1,40 @@
+import os
+import argparse
+
+from straw.shards import manifest_path, merge_shards, read_manifest
+
+
+def cli_main():
+
+    argparser = argparse.ArgumentParser(
+        "straw-merge-shards",
+        description="Merge the output parts of a straw-process-pile run with --output-mode shards.",
+    )
+
+    argparser.add_argument(
+        "--output-jsonl",
+        type=str,
+        help="The --output-jsonl of the run, its parts are listed in <output-jsonl>.manifest.json.",
+    )
+    argparser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        help="Path of the manifest, by default <output-jsonl>.manifest.json",
+    )
+    argparser.add_argument(
+        "--delete-parts",
+        action="store_true",
+        help="Delete the parts and the manifest after merging them",
+    )
+
+    args = argparser.parse_args()
+
+    manifest = args.manifest or manifest_path(args.output_jsonl)
+    part_paths = read_manifest(manifest)
+    size = merge_shards(args.output_jsonl, part_paths)
+    if args.delete_parts:
+        for part_path in part_paths:
+            os.remove(part_path)
+        os.remove(manifest)
+    print(f"Merged {len(part_paths)} parts, {size} bytes")
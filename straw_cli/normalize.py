@@ -1,23 +1,6 @@
-import json
-import itertools
-import multiprocessing as mp
-
-from tqdm import tqdm
-from straw.normalizer import TextNormalizer
-
 import argparse
 
-normalizer = TextNormalizer(lang="en")
-
-
-def normalize_jsonstrs(lines):
-    docs = []
-    for l in lines:
-        if l is not None:
-            docs.append(json.loads(l))
-
-    docs = normalizer(docs)
-    return "\n".join([json.dumps(d) for d in docs])
+from straw.pipeline import Normalize, Pipeline
 
 
 def cli_main():
@@ -28,12 +11,14 @@ def cli_main():
     )
 
     argparser.add_argument(
-        "--input-jsonl", type=str, help="Path of the jsonl file containing docs.",
+        "--input-jsonl",
+        type=str,
+        help="Path of the jsonl file containing docs (.zst, .gz and .xz are decompressed on the fly).",
     )
     argparser.add_argument(
         "--output-jsonl",
         type=str,
-        help="Directory to save the output in the same format as the input.",
+        help="Path to save the output in the same format as the input (.zst, .gz and .xz are compressed on the fly).",
     )
     argparser.add_argument(
         "--nworkers", type=int, default=8, help="Number of workers",
@@ -41,6 +26,11 @@ def cli_main():
     argparser.add_argument(
         "--chunksize", type=int, default=8, help="Number of docs to process per worker",
     )
+    argparser.add_argument(
+        "--fast-normalize",
+        action="store_true",
+        help="Use the fast path of the normalizer (same output, skips detokenizing clean paragraphs)",
+    )
     argparser.add_argument(
         "--total-docs",
         type=int,
@@ -50,23 +40,12 @@ def cli_main():
 
     args = argparser.parse_args()
 
-    indir = args.input_jsonl
-    outdir = args.output_jsonl
-    nworkers = args.nworkers
-    chunk_size = args.chunksize
-    total_docs = args.total_docs // chunk_size if args.total_docs is not None else None
-
-    with open(outdir, "w") as fo, open(indir) as fi:
-        with mp.Pool(processes=nworkers) as pool:
-            # We use imap instead of map because imap is lazy
-            # and can keep the order of the input.
-            processors_iter = pool.imap(
-                normalize_jsonstrs,
-                tqdm(
-                    itertools.zip_longest(*[fi] * chunk_size),
-                    desc="Normalizing docs",
-                    total=total_docs,
-                ),
-            )
-            for docs in processors_iter:
-                fo.write(docs)
+    pipeline = Pipeline([Normalize(fast=args.fast_normalize)])
+    pipeline.run(
+        args.input_jsonl,
+        args.output_jsonl,
+        args.nworkers,
+        args.chunksize,
+        total_docs=args.total_docs,
+        desc="Normalizing docs",
+    )
@@ -0,0 +1,69 @@
+import argparse
+
+from straw.pipeline import STAGES, Pipeline, parse_stages
+
+
+def cli_main():
+
+    argparser = argparse.ArgumentParser(
+        "straw-pipeline",
+        description="Apply a chain of stages to a jsonl file in a single pass.",
+    )
+
+    argparser.add_argument(
+        "--input-jsonl",
+        type=str,
+        help="Path of the jsonl file containing docs (.zst, .gz and .xz are decompressed on the fly).",
+    )
+    argparser.add_argument(
+        "--output-jsonl",
+        type=str,
+        help="Path to save the output in the same format as the input (.zst, .gz and .xz are compressed on the fly).",
+    )
+    argparser.add_argument(
+        "--stages",
+        type=str,
+        default=None,
+        help="""Comma separated stages with colon separated arguments, applied in order,
+        e.g. "subsets:subsets=Pile-CC,preprocess,normalize:fast=true:by_line=true,filter_lang".
+        Stages: """ + ", ".join(STAGES),
+    )
+    argparser.add_argument(
+        "--config",
+        type=str,
+        default=None,
+        help="""Path of a json file with the list of stages instead of --stages,
+        e.g. [{"stage": "normalize", "fast": true}, {"stage": "filter_lang"}]""",
+    )
+    argparser.add_argument(
+        "--nworkers", type=int, default=8, help="Number of workers",
+    )
+    argparser.add_argument(
+        "--chunksize", type=int, default=8, help="Number of docs to process per worker",
+    )
+    argparser.add_argument(
+        "--total-docs",
+        type=int,
+        default=None,
+        help="Number of docs to process (for logging progress)",
+    )
+
+    args = argparser.parse_args()
+    if (args.stages is None) == (args.config is None):
+        argparser.error("one of --stages and --config is required")
+
+    try:
+        if args.config is not None:
+            pipeline = Pipeline.from_file(args.config)
+        else:
+            pipeline = Pipeline.from_config(parse_stages(args.stages))
+    except (TypeError, ValueError) as e:
+        argparser.error(str(e))
+
+    pipeline.run(
+        args.input_jsonl,
+        args.output_jsonl,
+        args.nworkers,
+        args.chunksize,
+        total_docs=args.total_docs,
+    )
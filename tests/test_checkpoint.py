@@ -0,0 +1,132 @@
+import io
+import os
+import json
+import random
+
+from straw.checkpoint import Checkpoint
+from straw_cli.main import read_work_units
+
+
+def test_add_merges_intervals():
+    checkpoint = Checkpoint("checkpoint")
+    checkpoint.add(10, 20)
+    checkpoint.add(30, 40)
+    checkpoint.add(0, 5)
+    assert checkpoint.completed == [(0, 5), (10, 20), (30, 40)]
+    # Empty ranges are ignored
+    checkpoint.add(50, 50)
+    assert checkpoint.completed == [(0, 5), (10, 20), (30, 40)]
+    # Touching intervals
+    checkpoint.add(5, 10)
+    assert checkpoint.completed == [(0, 20), (30, 40)]
+    # Overlapping, and covering several intervals
+    checkpoint.add(15, 35)
+    assert checkpoint.completed == [(0, 40)]
+    checkpoint.add(60, 70)
+    checkpoint.add(45, 50)
+    checkpoint.add(41, 80)
+    assert checkpoint.completed == [(0, 40), (41, 80)]
+    checkpoint.add(20, 30)
+    assert checkpoint.completed == [(0, 40), (41, 80)]
+
+
+def test_add_in_any_order():
+    ranges = [(i, i + 10) for i in range(0, 1000, 10)]
+    random.Random(0).shuffle(ranges)
+    checkpoint = Checkpoint("checkpoint")
+    for start, end in ranges[:50]:
+        checkpoint.add(start, end)
+    for start, end in ranges[:50]:
+        assert checkpoint.covers(start, end)
+    for start, end in ranges[50:]:
+        assert not checkpoint.covers(start, end)
+        assert checkpoint.missing(start, end) == [(start, end)]
+    for start, end in ranges[50:]:
+        checkpoint.add(start, end)
+    assert checkpoint.completed == [(0, 1000)]
+
+
+def test_covers_and_missing():
+    checkpoint = Checkpoint("checkpoint")
+    checkpoint.add(10, 20)
+    checkpoint.add(30, 40)
+    assert checkpoint.covers(10, 20) and checkpoint.covers(12, 18)
+    assert not checkpoint.covers(5, 15)
+    assert not checkpoint.covers(15, 35)
+    assert not checkpoint.covers(0, 5)
+    assert checkpoint.missing(0, 50) == [(0, 10), (20, 30), (40, 50)]
+    assert checkpoint.missing(15, 35) == [(20, 30)]
+    assert checkpoint.missing(10, 20) == []
+    assert checkpoint.missing(42, 45) == [(42, 45)]
+    assert Checkpoint("checkpoint").missing(0, 10) == [(0, 10)]
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "output.jsonl.checkpoint")
+    checkpoint = Checkpoint(path, "/data/input.jsonl")
+    checkpoint.add(0, 100)
+    checkpoint.add(200, 300)
+    checkpoint.output_offset = 1234
+    checkpoint.state = {"duplicates": 5, "hashstore_size": 820}
+    checkpoint.save()
+    assert not os.path.exists(path + ".tmp")
+
+    loaded = Checkpoint.load(path)
+    assert loaded.input_path == "/data/input.jsonl"
+    assert loaded.completed == [(0, 100), (200, 300)]
+    assert loaded.output_offset == 1234
+    assert loaded.state == {"duplicates": 5, "hashstore_size": 820}
+
+
+def test_interrupted_save_keeps_previous_checkpoint(tmp_path):
+    path = str(tmp_path / "output.jsonl.checkpoint")
+    checkpoint = Checkpoint(path, "input.jsonl")
+    checkpoint.add(0, 100)
+    checkpoint.save()
+
+    # Killed while writing the next checkpoint
+    with open(path + ".tmp", "w") as f:
+        f.write('{"input": "input.jsonl", "compl')
+    assert Checkpoint.load(path).completed == [(0, 100)]
+
+    checkpoint.add(100, 200)
+    checkpoint.save()
+    assert Checkpoint.load(path).completed == [(0, 200)]
+    with open(path) as f:
+        assert json.load(f)["completed"] == [[0, 200]]
+
+
+def test_resume_skips_completed_lines(tmp_path):
+    lines = [
+        json.dumps({"text": "doc {}".format(i) * (i % 7 + 1)}).encode() + b"\n"
+        for i in range(100)
+    ]
+    data = b"".join(lines)
+    units = list(read_work_units(io.BytesIO(data), 8))
+    assert b"".join(line for _, unit in units for line in unit) == data
+    for (start, end), unit in units:
+        assert data[start:end] == b"".join(unit)
+
+    # The units completed out of order before a crash, reloaded from disk
+    path = str(tmp_path / "output.jsonl.checkpoint")
+    checkpoint = Checkpoint(path, "input.jsonl")
+    completed = [units[i] for i in (0, 1, 4, 2, 9, 10)]
+    for byte_range, _ in completed:
+        checkpoint.add(*byte_range)
+    checkpoint.save()
+    checkpoint = Checkpoint.load(path)
+
+    resumed = list(read_work_units(io.BytesIO(data), 8, checkpoint))
+    resumed_lines = [line for _, unit in resumed for line in unit]
+    completed_lines = [line for _, unit in completed for line in unit]
+    assert sorted(resumed_lines + completed_lines) == sorted(lines)
+    assert not set(resumed_lines) & set(completed_lines)
+    for (start, end), unit in resumed:
+        assert data[start:end] == b"".join(unit)
+        assert checkpoint.missing(start, end) == [(start, end)]
+
+    # Resuming the resumed run completes the input
+    for byte_range, _ in resumed:
+        checkpoint.add(*byte_range)
+    assert checkpoint.completed == [(0, len(data))]
+    assert list(read_work_units(io.BytesIO(data), 8, checkpoint)) == []
@@ -0,0 +1,180 @@
+import os
+import pickle
+import hashlib
+
+import numpy as np
+import pytest
+
+from straw.dedup import BloomFilter, HashStore, merge_stores
+
+
+def md5s(start, end):
+    return [hashlib.md5(str(i).encode()).hexdigest() for i in range(start, end)]
+
+
+@pytest.mark.parametrize("digest_size", [8, 16])
+def test_add_and_contains(digest_size):
+    store = HashStore(digest_size=digest_size, flush_size=100)
+    hashes = md5s(0, 1000)
+    assert store.add_many(hashes[:600]).all()
+    # Half of the digests were flushed to runs, the others are pending
+    new = store.add_many(hashes[300:])
+    assert not new[:300].any() and new[300:].all()
+    assert not store.add_many(hashes[700:710] * 2).any()
+    assert store.add_many(md5s(1000, 1002) * 2).tolist() == [True, True, False, False]
+    assert len(store) == 1002
+    assert store.contains_many(hashes).all()
+    assert not store.contains_many(md5s(2000, 3000)).any()
+    assert hashes[0] in store and md5s(2000, 2001)[0] not in store
+    assert not store.add(hashes[0]) and store.add(md5s(2000, 2001)[0])
+
+
+def test_digest_formats():
+    store = HashStore()
+    digest = hashlib.md5(b"doc")
+    assert store.add(digest.hexdigest())
+    assert digest.digest() in store
+    assert store.contains_many(store.to_array([digest.digest()])).all()
+
+
+def test_commit_and_reload(tmp_path):
+    path = str(tmp_path / "hashes")
+    store = HashStore(path, flush_size=100)
+    store.add_many(md5s(0, 500))
+    size = store.commit()
+    assert size == os.path.getsize(path)
+    store.add_many(md5s(400, 800))
+    assert store.commit() > size
+    # Nothing new, the file does not grow
+    assert store.commit() == os.path.getsize(path)
+
+    reloaded = HashStore(path)
+    assert len(reloaded.runs) == 2
+    assert len(reloaded) == 800
+    assert reloaded.contains_many(md5s(0, 800)).all()
+    assert not reloaded.add_many(md5s(0, 800)).any()
+    assert not reloaded.contains_many(md5s(800, 900)).any()
+
+
+def test_sorted_runs_merge():
+    store = HashStore(flush_size=10)
+    for i in range(0, 1000, 10):
+        store.add_many(md5s(i, i + 10))
+    # The in-memory runs are merged like a binary counter
+    assert len(store.runs) <= 8
+    for run in store.runs:
+        assert (run[:-1] < run[1:]).all()
+    assert store.contains_many(md5s(0, 1000)).all()
+
+
+def test_incomplete_run_is_ignored_and_overwritten(tmp_path):
+    path = str(tmp_path / "hashes")
+    store = HashStore(path)
+    store.add_many(md5s(0, 100))
+    size = store.commit()
+    store.add_many(md5s(100, 200))
+    store.commit()
+    # Killed while committing the second run
+    os.truncate(path, os.path.getsize(path) - 5)
+
+    store = HashStore(path)
+    assert store.valid_size == size
+    assert len(store) == 100
+    assert store.add_many(md5s(100, 200)).all()
+    store.commit()
+
+    store = HashStore(path)
+    assert len(store) == 200
+    assert store.contains_many(md5s(0, 200)).all()
+
+
+def test_committed_size_drops_later_runs(tmp_path):
+    path = str(tmp_path / "hashes")
+    store = HashStore(path)
+    store.add_many(md5s(0, 100))
+    size = store.commit()
+    store.add_many(md5s(100, 200))
+    store.commit()
+
+    # Resuming from a checkpoint taken after the first commit
+    store = HashStore(path, committed_size=size)
+    assert len(store) == 100
+    assert not store.contains_many(md5s(100, 200)).any()
+    store.add_many(md5s(200, 300))
+    store.commit()
+
+    store = HashStore(path)
+    assert len(store) == 200
+    assert not store.contains_many(md5s(100, 200)).any()
+    assert store.contains_many(md5s(200, 300)).all()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    rng = np.random.RandomState(0)
+    digests = rng.randint(0, 1 << 63, size=10000, dtype=np.uint64).astype(">u8")
+    bloom = BloomFilter(1 << 16)
+    bloom.add(digests[:5000], block_size=1000)
+    assert bloom.contains(digests[:5000]).all()
+    assert bloom.contains(digests[5000:]).mean() < 0.1
+
+    wide = rng.randint(0, 256, size=(1000, 16), dtype=np.uint8).view("V16").ravel()
+    bloom = BloomFilter(1 << 14)
+    bloom.add(wide)
+    assert bloom.contains(wide).all()
+
+
+def test_store_with_bloom_filter(tmp_path):
+    path = str(tmp_path / "hashes")
+    store = HashStore(path, bloom_bits=1 << 16, flush_size=100)
+    assert store.add_many(md5s(0, 1000)).all()
+    assert not store.add_many(md5s(0, 1000)).any()
+    store.commit()
+
+    store = HashStore(path, bloom_bits=1 << 16)
+    assert store.contains_many(md5s(0, 1000)).all()
+    assert store.add_many(md5s(1000, 2000)).all()
+
+
+def test_compact_and_merge_stores(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a", "b")]
+    for path, (start, end) in zip(paths, [(0, 600), (400, 1000)]):
+        store = HashStore(path, flush_size=100)
+        store.add_many(md5s(start, end))
+        store.commit()
+
+    store = HashStore(paths[0])
+    store.add_many(md5s(500, 700))
+    assert store.compact() == 700
+    store = HashStore(paths[0])
+    assert len(store.runs) == 1 and len(store) == 700
+
+    output_path = str(tmp_path / "merged")
+    assert merge_stores(output_path, paths) == 1000
+    merged = HashStore(output_path)
+    assert len(merged.runs) == 1
+    assert merged.contains_many(md5s(0, 1000)).all()
+
+    wide_path = str(tmp_path / "wide")
+    store = HashStore(wide_path, digest_size=16)
+    store.add_many(md5s(0, 10))
+    store.commit()
+    with pytest.raises(ValueError):
+        merge_stores(output_path, paths + [wide_path])
+
+
+def test_legacy_pickle_is_converted(tmp_path):
+    path = str(tmp_path / "hashes")
+    with open(path, "wb") as f:
+        pickle.dump(set(md5s(0, 100)), f)
+
+    store = HashStore(path)
+    assert len(store) == 100
+    assert store.contains_many(md5s(0, 100)).all()
+    store.add_many(md5s(100, 200))
+    store.commit()
+
+    store = HashStore(path)
+    assert not store.legacy
+    assert len(store) == 200
+    assert store.contains_many(md5s(0, 200)).all()
+    assert merge_stores(str(tmp_path / "merged"), [path]) == 200
@@ -0,0 +1,24 @@
+import os
+import json
+
+from straw.filtering import RedundancyFilter
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "wiki-processed-sample.txt",
+)
+
+
+def test_token_char_ratio():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        text = f.read()
+    lines = [text[i : i + 1000] for i in range(0, len(text), 1000)]
+    lines += ["a", "ab ab ab ab", "ß∂ƒ©˙∆˚¬", json.dumps(lines[:2])]
+
+    redundancy_filter = RedundancyFilter()
+    ratios = redundancy_filter.get_token_char_ratio(lines)
+    expected = [len(redundancy_filter.spm.encode(line)) / len(line) for line in lines]
+    assert ratios.tolist() == expected
+    assert RedundancyFilter(num_threads=1).get_token_char_ratio(lines).tolist() == (
+        expected
+    )
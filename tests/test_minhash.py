@@ -0,0 +1,121 @@
+import random
+
+import numpy as np
+import pytest
+
+from straw.minhash import LSHIndex, MinHasher, optimal_lsh_params
+
+
+def make_texts(num_texts, num_words=200, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ["word{}".format(i) for i in range(5000)]
+    return [" ".join(rng.choices(vocabulary, k=num_words)) for _ in range(num_texts)]
+
+
+def jaccard(minhasher, a, b):
+    a, b = set(minhasher.shingles(a)), set(minhasher.shingles(b))
+    return len(a & b) / len(a | b)
+
+
+def test_shingles():
+    minhasher = MinHasher(ngram=2)
+    assert len(minhasher.shingles("a b c")) == 2
+    assert len(minhasher.shingles("a b a b")) == 2
+    # Case and whitespace do not matter
+    assert (
+        minhasher.shingles("Héllo  wörld\n foo") == minhasher.shingles("héllo wörld foo")
+    ).all()
+    # Fewer words than ngram
+    assert len(minhasher.shingles("a")) == 1
+    assert len(minhasher.shingles(" \t\n")) == 0
+
+
+def test_signature_is_deterministic():
+    text = make_texts(1)[0]
+    signature = MinHasher().signature(text)
+    assert signature.dtype == np.uint32 and len(signature) == 128
+    assert (MinHasher().signature(text) == signature).all()
+    assert (MinHasher().signature(text, block_size=7) == signature).all()
+    assert not (MinHasher(seed=2).signature(text) == signature).all()
+
+
+def test_signature_estimates_jaccard():
+    minhasher = MinHasher(num_perm=256, ngram=1)
+    a = make_texts(1, num_words=2000)[0]
+    words = a.split()
+    b = " ".join(words[:1000] + make_texts(1, num_words=1000, seed=1)[0].split())
+    estimate = (minhasher.signature(a) == minhasher.signature(b)).mean()
+    assert abs(estimate - jaccard(minhasher, a, b)) < 0.1
+
+
+def test_optimal_lsh_params():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = optimal_lsh_params(threshold, 128)
+        assert bands * rows <= 128
+        # The collision probability rises around the threshold
+        assert (1 / bands) ** (1 / rows) == pytest.approx(threshold, abs=0.15)
+    assert optimal_lsh_params(0.9, 128)[1] > optimal_lsh_params(0.5, 128)[1]
+
+
+def test_near_duplicates():
+    minhasher, index = MinHasher(), LSHIndex(threshold=0.8)
+    texts = make_texts(50)
+    keys = [minhasher.band_keys(text, index.bands, index.rows) for text in texts]
+    assert all(len(k) == 8 * index.bands for k in keys)
+    assert all(index.add(k) for k in keys)
+    assert not any(index.add(k) for k in keys)
+
+    # A small edit is a near-duplicate, an unrelated text is not
+    edited = texts[0].replace("word", "Word", 1) + " extra"
+    assert not index.add(minhasher.band_keys(edited, index.bands, index.rows))
+    other = make_texts(1, seed=1)[0]
+    assert index.add(minhasher.band_keys(other, index.bands, index.rows))
+
+
+def test_texts_without_words_are_unique():
+    minhasher, index = MinHasher(), LSHIndex()
+    texts = ["", "   ", "\n\t", "a", "b"]
+    keys = [minhasher.band_keys(text, index.bands, index.rows) for text in texts]
+    assert keys[:3] == [b"", b"", b""]
+    assert [index.add(k) for k in keys] == [True] * len(texts)
+    assert not index.add(keys[3])
+
+
+def test_index_persists(tmp_path):
+    path = str(tmp_path / "lsh")
+    minhasher = MinHasher()
+    texts = make_texts(30)
+
+    index = LSHIndex(path, threshold=0.7)
+    for text in texts[:10]:
+        assert index.add(minhasher.band_keys(text, index.bands, index.rows))
+    size = index.commit()
+    for text in texts[10:20]:
+        assert index.add(minhasher.band_keys(text, index.bands, index.rows))
+    index.commit()
+
+    index = LSHIndex(path, threshold=0.7, bloom_bits=1 << 16)
+    assert not any(
+        index.add(minhasher.band_keys(text, index.bands, index.rows))
+        for text in texts[:20]
+    )
+    assert all(
+        index.add(minhasher.band_keys(text, index.bands, index.rows))
+        for text in texts[20:]
+    )
+
+    # Resuming from the first commit forgets the bands added after it
+    index = LSHIndex(path, threshold=0.7, committed_size=size)
+    assert not any(
+        index.add(minhasher.band_keys(text, index.bands, index.rows))
+        for text in texts[:10]
+    )
+    assert all(
+        index.add(minhasher.band_keys(text, index.bands, index.rows))
+        for text in texts[10:20]
+    )
+
+    with pytest.raises(ValueError):
+        LSHIndex(path, threshold=0.8)
+    with pytest.raises(ValueError):
+        LSHIndex(path, threshold=0.7, ngram=3)
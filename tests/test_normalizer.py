@@ -0,0 +1,122 @@
+import os
+import re
+
+import pytest
+
+from straw.normalizer import TextNormalizer, is_normalized
+from straw.preprocessing import process_webcrawls
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "wiki-processed-sample.txt",
+)
+
+# Paragraphs with detokenizer artifacts, and characters or sequences changed by the
+# normalization map, NFKC and the punctuation rules
+EDGE_CASES = [
+    "Hello , world . How are you ?",
+    "He said : `` yes '' ; then left !",
+    "do n't , ca n't , it 's , we 're",
+    "It costs $ 5 or € 10 ( about 20 % ) [ sic ] { x }",
+    "¿ Qué ? ¡ Hola !",
+    "the state @-@ of @-@ the @-@ art",
+    "Tom &amp; Jerry &lt;3 &quot;quoted&quot; &apos;single&apos;",
+    "left&lrm;to&rlm;right",
+    "ＦＵＬＬＷＩＤＴＨ ＆ｌｒｍ； ｔｅｘｔ ＡＢＣ１２３",
+    "中 文 字 and 日本 語",
+    "«Hello World» — she said…",
+    "‘single’ and “double” quotes, „low” quotes",
+    "It’s the ¨quote¨ and ♪ music ♫ ● bullet",
+    "zero​width",
+    "  leading and trailing spaces  ",
+    "double  spaces and\ttabs\nand newlines",
+    "non breaking thin　ideographic spaces",
+    'quotes before punctuation", and". ok',
+    "two single quotes '' and a backtick ` here",
+    "spaces before colon : semicolon ; percent % marks",
+    "(brackets) and [square] and {curly}",
+    "control\x07chars\x00here",
+    "ﬁ ligature and ² superscript and Ⅻ numeral",
+    "en–dash and em—dash and minus − sign",
+    "Ellipsis... and more…",
+    "'quoted start and end'",
+    " '",
+    "",
+    # One rule of is_normalized each
+    "a  double space",
+    " a leading space",
+    "a trailing space ",
+    "a (bracket",
+    "a `backtick",
+    "two''quotes",
+    "a colon :here",
+    "a semicolon ;here",
+    "a percent %here",
+    'a quote", comma',
+    'a quote". period',
+    "an &ampersand",
+    "a , comma",
+    "plain ASCII text that is already normalized.",
+    "x" * 5000 + " , long paragraph",
+]
+
+
+def load_corpus():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        text = f.read()
+    paragraphs = [line for line in text.split("\n") if line.strip()]
+    sentences = re.split(r"(?<=[.?!])\s+", text)[:200]
+    return EDGE_CASES + paragraphs + sentences + process_webcrawls(text)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return load_corpus()
+
+
+@pytest.fixture(scope="module")
+def expected(corpus):
+    normalizer = TextNormalizer()
+    return [normalizer(paragraph) for paragraph in corpus]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"fast": True},
+        {"cache_size": 1 << 20},
+        {"fast": True, "cache_size": 1 << 20},
+    ],
+)
+def test_same_output_as_standard_normalizer(corpus, expected, options):
+    normalizer = TextNormalizer(**options)
+    # Twice, the second time through the cache hits
+    assert normalizer(corpus + corpus) == expected + expected
+    assert [normalizer(paragraph) for paragraph in corpus] == expected
+
+    if normalizer.cache is not None:
+        stats = normalizer.cache.pop_stats()
+        assert stats["hits"] > 0
+        assert stats["skipped"] > 0
+        assert stats["uncached"] > 0
+
+
+def test_small_cache_evicts(corpus, expected):
+    normalizer = TextNormalizer(fast=True, cache_size=4096)
+    assert normalizer(corpus + corpus) == expected + expected
+    assert normalizer.cache.pop_stats()["evictions"] > 0
+
+
+def test_is_normalized_is_sufficient(corpus, expected):
+    normalizer = TextNormalizer()
+    candidates = corpus + expected
+    normalized = [text for text in candidates if is_normalized(text)]
+    assert normalized
+    for text in normalized:
+        assert normalizer(text) == text
+
+
+def test_is_normalized_rejects_edge_cases():
+    for text in EDGE_CASES[:-2]:
+        if text.strip():
+            assert not is_normalized(text), text
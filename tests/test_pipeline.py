@@ -0,0 +1,50 @@
+import json
+import random
+
+from straw.normalizer import TextNormalizer
+from straw.pipeline import Pipeline, parse_stages
+
+
+def make_lines(num_docs, seed=0):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(num_docs):
+        text = "word " * rng.randint(0, 5) + "‘quoted’ , text"
+        docs.append({"text": text, "meta": {"id": i}})
+    return docs, [(json.dumps(doc) + "\n").encode("utf-8") for doc in docs]
+
+
+def test_parse_stages():
+    assert parse_stages(
+        "preprocess,normalize:fast=true:by_line=true,subsets:subsets=Pile-CC"
+    ) == [
+        {"stage": "preprocess"},
+        {"stage": "normalize", "fast": True, "by_line": True},
+        {"stage": "subsets", "subsets": "Pile-CC"},
+    ]
+
+
+def test_multi_stage_chain():
+    docs, lines = make_lines(2000)
+    pipeline = Pipeline.from_config(
+        parse_stages("min_length:min_length=30,normalize,normalize")
+    )
+    pipeline.load()
+    output = [json.loads(line) for line in pipeline.process_lines(lines).splitlines()]
+
+    normalizer = TextNormalizer()
+    expected = []
+    for doc in docs:
+        if len(doc["text"]) >= 30:
+            text = normalizer([normalizer([doc["text"]])[0]])[0]
+            expected.append(dict(doc, text=text))
+    assert 0 < len(expected) < len(docs)
+    assert output == expected
+
+
+def test_unchanged_docs_keep_their_lines():
+    docs, lines = make_lines(100)
+    pipeline = Pipeline.from_config([{"stage": "min_length", "min_length": 30}])
+    pipeline.load()
+    kept = [line for doc, line in zip(docs, lines) if len(doc["text"]) >= 30]
+    assert pipeline.process_lines(lines + [None]) == b"".join(kept)
@@ -0,0 +1,56 @@
+import os
+import gzip
+import json
+
+import pytest
+
+import straw.preprocessing
+
+# Outputs of the preprocessors before the Cleaner rewrite, for wiki-processed-sample.txt
+# and texts laid out like each subset around its sentences (benchmarks/synthetic.py)
+GOLDEN_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "preprocessing_golden.json.gz"
+)
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with gzip.open(GOLDEN_PATH, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize(
+    "name",
+    ["process_books3", "process_gutenberg", "process_webcrawls", "process_wiki"],
+)
+def test_preprocessors_match_golden(golden, name):
+    process = getattr(straw.preprocessing, name)
+    for text, expected in zip(golden["texts"], golden["outputs"][name]):
+        assert process(text) == expected
+
+
+def test_chunks_are_shorter_than_max_len(golden):
+    index = straw.preprocessing.SentenceIndex("Aaaa. Bbbb. Cc")
+    assert index.chunk_spans(6) == [(0, 5), (5, 11), (11, 14)]
+    assert index.chunk_spans(11) == [(0, 5), (5, 11), (11, 14)]
+    assert index.chunk_spans(12) == [(0, 11), (11, 14)]
+    # The remainder after the last sentence end is split off, like before
+    assert index.chunk_spans(15) == [(0, 11), (11, 14)]
+    assert straw.preprocessing.naive_sentence_split(
+        "It works. Share this: Twitter Facebook", 1000
+    ) == ["It works.", "Share this: Twitter Facebook"]
+    assert straw.preprocessing.SentenceIndex("No sentence end").chunk_spans(6) == [
+        (0, 6),
+        (6, 12),
+        (12, 15),
+    ]
+
+    for text in golden["texts"]:
+        index = straw.preprocessing.SentenceIndex(text)
+        spans = index.chunk_spans(1000)
+        assert "".join(text[s:e] for s, e in spans) == text
+        for start, end in spans:
+            # Only the sentences that do not fit are cut at max_len
+            assert end - start < 1000 or (
+                end - start == 1000 and not (index.ends[index.ends > start] < end).any()
+            )
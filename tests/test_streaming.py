@@ -0,0 +1,60 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+from straw.streaming import StreamProcessor
+from straw_cli.main import StrawProcessor
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "wiki-processed-sample.txt",
+)
+OPTIONS = {"min_text_length": 1000, "max_text_length": 5000}
+
+
+def make_records():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        text = f.read()
+    return [
+        {"text": text[i : i + 20000], "meta": {"pile_set_name": subset}}
+        for i in range(0, 80000, 20000)
+        for subset in ("Wikipedia (en)", "Pile-CC", "Github")
+    ]
+
+
+async def iterate(records):
+    for record in records:
+        yield record
+
+
+async def stream(records, **kwargs):
+    processor = StrawProcessor.from_options(**OPTIONS)
+    async with StreamProcessor(processor, nworkers=1, **kwargs) as stream_processor:
+        return [record async for record in stream_processor.process(iterate(records))]
+
+
+def test_from_options():
+    processor = StrawProcessor.from_options(min_text_length=100, fast_normalize=True)
+    assert processor.args.min_text_length == 100
+    assert processor.args.fast_normalize
+    assert processor.args.max_text_length == 1000_000_000
+    with pytest.raises(ValueError):
+        StrawProcessor.from_options(min_length=100)
+
+
+def test_stream_matches_straw_process_pile():
+    records = make_records()
+    lines = [json.dumps(record).encode("utf-8") for record in records]
+
+    processor = StrawProcessor.from_options(**OPTIONS)
+    processor.initialize()
+    expected = [json.loads(line) for line in processor.process(lines)[1]]
+    assert expected
+    assert {record["subset"] for record in expected} == {"Wikipedia (en)", "Pile-CC"}
+
+    assert asyncio.run(stream(records, batch_size=5, ordered=True)) == expected
+    assert asyncio.run(stream(lines, batch_size=5, ordered=True)) == expected
+    unordered = asyncio.run(stream([line.decode() for line in lines], batch_size=5))
+    assert sorted(unordered, key=json.dumps) == sorted(expected, key=json.dumps)